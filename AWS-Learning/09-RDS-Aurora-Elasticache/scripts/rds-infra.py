@@ -1,9 +1,14 @@
+import asyncio
 import boto3
 import logging
 import dotenv
 import os
+import random
+import threading
 import time
-from typing import Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 logging.basicConfig(
@@ -12,6 +17,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Adaptive mode retries throttled calls with backoff and also rate limits the
+# client side once throttling starts, shared by every thread using the client
+RETRY_CONFIG = Config(retries={'max_attempts': 10, 'mode': 'adaptive'})
+
+# An instance identifier in the default region, or (region, identifier)
+Target = Union[str, Tuple[str, str]]
+
+# Values a describe_db_instances filter takes at most
+FILTER_VALUES_LIMIT = 100
+
+# Statuses an instance doesn't leave on its own, waiting on them is pointless
+FAILED_STATES = {
+    'failed',
+    'inaccessible-encryption-credentials',
+    'incompatible-network',
+    'incompatible-option-group',
+    'incompatible-parameters',
+    'incompatible-restore',
+    'restore-error',
+    'storage-full'
+}
+
+def is_transient(error: ClientError) -> bool:
+    """Throttling or a server side error, left after the client's own retries: worth another try later"""
+    code = error.response['Error'].get('Code', '')
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+    return status >= 500 or 'Throttl' in code or code == 'RequestLimitExceeded'
+
 class RDSInfra:
     """
     Manages AWS RDS infra operations
@@ -19,22 +52,123 @@ class RDSInfra:
     - Database instance creation with proper security groups
     - Instance state management (start, stop, delete)
     - Configuration retrieval and monitoring
+    - Fleet operations fanned out over a bounded thread pool
+    - Paginated inventory with a short lived cache of describe results
     
     Attributes:
-        client: boto3
-        region: AWS availability zone
+        client: boto3 client for the default region
+        region: default AWS region
+        max_workers: concurrent API calls of the fleet operations
+        cache_ttl: seconds describe results are reused, 0 disables the cache
     """
     
-    def __init__(self, region_name: str = 'mx-central-1'):
+    def __init__(self, region_name: str = 'mx-central-1', max_workers: int = 8, cache_ttl: float = 30):
         """
         Initialize RDS infrastructure manager.
         Args:
-            region_name (str, optional): _description_. Defaults to 'mx-central-1'.
+            region_name (str, optional): Default region. Defaults to 'mx-central-1'.
+            max_workers (int, optional): Threads used by the fleet operations. Defaults to 8.
+            cache_ttl (float, optional): Seconds describe results are cached. Defaults to 30.
         """
-        self.client = boto3.client('rds', region_name=region_name)
         self.region = region_name
+        self.max_workers = max_workers
+        self.cache_ttl = cache_ttl
+        # (service, region) -> client
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._clients_lock = threading.Lock()
+        # (region, identifier) -> (expires, DBInstance)
+        self._instances: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+        # (region, engine, tags) -> (expires, [DBInstance])
+        self._listings: Dict[Tuple, Tuple[float, List[Dict]]] = {}
+        self._cache_lock = threading.Lock()
+        self.client = self.get_client(region_name)
         logger.info(f"RDS Infrastructure Manager initialized for region: {region_name}")
         
+    def get_client(self, region_name: Optional[str] = None, service: str = 'rds'):
+        """
+        Client of a service (RDS by default) for a region, created once and
+        reused. Clients are thread safe, creating them (the default session)
+        is not, hence the lock.
+        """
+        region_name = region_name or self.region
+        key = (service, region_name)
+        with self._clients_lock:
+            if key not in self._clients:
+                self._clients[key] = boto3.client(service, region_name=region_name, config=RETRY_CONFIG)
+            return self._clients[key]
+        
+    def _cache_instance(self, region_name: str, instance: Dict) -> None:
+        if self.cache_ttl <= 0:
+            return
+        with self._cache_lock:
+            self._instances[(region_name, instance['DBInstanceIdentifier'])] = (
+                time.monotonic() + self.cache_ttl, instance
+            )
+    
+    def _cached_instance(self, region_name: str, db_instance_identifier: str) -> Optional[Dict]:
+        with self._cache_lock:
+            entry = self._instances.get((region_name, db_instance_identifier))
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+    
+    def invalidate(self, db_instance_identifier: Optional[str] = None, region_name: Optional[str] = None) -> None:
+        """
+        Forget cached describe results after a change: the instance (every
+        instance of the region when None) and all listings of its region.
+        """
+        region_name = region_name or self.region
+        with self._cache_lock:
+            if db_instance_identifier is None:
+                self._instances = {key: entry for key, entry in self._instances.items() if key[0] != region_name}
+            else:
+                self._instances.pop((region_name, db_instance_identifier), None)
+            self._listings = {key: entry for key, entry in self._listings.items() if key[0] != region_name}
+    
+    def _tagged_instance_arns(self, tags: Dict[str, str], region_name: str) -> List[str]:
+        """ARNs of the DB instances carrying all of the tags, from the Resource Groups Tagging API"""
+        tagging = self.get_client(region_name, service='resourcegroupstaggingapi')
+        arns = []
+        for page in tagging.get_paginator('get_resources').paginate(
+            ResourceTypeFilters=['rds:db'],
+            TagFilters=[{'Key': key, 'Values': [value]} for key, value in tags.items()]
+        ):
+            arns.extend(resource['ResourceARN'] for resource in page['ResourceTagMappingList'])
+        return arns
+    
+    def iter_instances(
+        self,
+        engine: Optional[str] = None,
+        tags: Optional[Dict[str, str]] = None,
+        region_name: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Stream every DBInstance record of a region page by page (describe
+        returns at most 100 per call), filtered by the API on engine and tags
+        (all of them must match). Records are cached as they go by.
+        """
+        region_name = region_name or self.region
+        filters = []
+        if engine:
+            filters.append({'Name': 'engine', 'Values': [engine]})
+        
+        # describe_db_instances can't filter on tags, but its db-instance-id
+        # filter takes ARNs, so tags are resolved to ARNs first
+        id_batches: List[List[str]] = [[]]
+        if tags:
+            arns = self._tagged_instance_arns(tags, region_name)
+            if not arns:
+                return
+            id_batches = [arns[i:i + FILTER_VALUES_LIMIT] for i in range(0, len(arns), FILTER_VALUES_LIMIT)]
+        
+        paginator = self.get_client(region_name).get_paginator('describe_db_instances')
+        for ids in id_batches:
+            batch_filters = filters + ([{'Name': 'db-instance-id', 'Values': ids}] if ids else [])
+            for page in paginator.paginate(Filters=batch_filters):
+                for instance in page['DBInstances']:
+                    self._cache_instance(region_name, instance)
+                    yield instance
+        
     def create_database_instance(
         self,
         db_instance_identifier: str,
@@ -47,7 +181,8 @@ class RDSInfra:
         engine_version: str = '17.6',
         publicly_accessible: bool = True,
         backup_retention_period: int = 7,
-        storage_encrypted: bool = True
+        storage_encrypted: bool = True,
+        region_name: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Create a new RDS PostgreSQL instance.
@@ -70,6 +205,7 @@ class RDSInfra:
             publicly_accessible (bool, optional): _description_. Defaults to True.
             backup_retention_period (int, optional): _description_. Defaults to 7.
             storage_encrypted (bool, optional): _description_. Defaults to True.
+            region_name (str, optional): Region to create it in. Defaults to the default region.
 
         Returns:
             Dict containing RDS instance creation response
@@ -77,12 +213,13 @@ class RDSInfra:
         Raises:
             ClientError: If RDS instance creation fails
         """
+        client = self.get_client(region_name)
         try:
             logger.info(f"Creating RDS instance: {db_instance_identifier}")
             
             if engine_version is None:
                 logger.info("No engine version specified, getting latest available...")
-                versions_response = self.client.describe_db_engine_versions(
+                versions_response = client.describe_db_engine_versions(
                     Engine=engine,
                     DefaultOnly=True
                 )
@@ -94,7 +231,7 @@ class RDSInfra:
                     engine_version = '16.1'
                     logger.info(f"Using fallback engine version: {engine_version}")
             
-            response = self.client.create_db_instance(
+            response = client.create_db_instance(
                 DBInstanceIdentifier=db_instance_identifier,
                 DBName=db_name,
                 MasterUsername=master_username,
@@ -123,6 +260,7 @@ class RDSInfra:
                 ]
             )
             
+            self.invalidate(db_instance_identifier, region_name)
             logger.info(f"RDS instance creation initiated successfully")
             logger.info(f"Instance ID: {db_instance_identifier}")
             logger.info(f"Status: {response['DBInstance'].get('DBInstanceStatus', 'Unknown')}")
@@ -141,60 +279,95 @@ class RDSInfra:
         max_attempts: int = 60,
         delay: int = 30
     ) -> bool:
+        """Wait up to max_attempts * delay seconds, polling every `delay` seconds at most"""
         logger.info(f"Waiting for instance {db_instance_identifier} to become available...")
-        
-        try:
-            waiter = self.client.get_waiter('db_instance_available')
-            waiter.wait(
-                DBInstanceIdentifier=db_instance_identifier,
-                WaiterConfig={
-                    'Delay': delay,
-                    'MaxAttempts': max_attempts
-                }
-            )
+        result = self.wait_for_instances(
+            [db_instance_identifier],
+            timeout=max_attempts * delay,
+            max_delay=delay
+        )
+        if db_instance_identifier in result['succeeded']:
             logger.info(f"Instance {db_instance_identifier} is now available!")
             return True
-            
-        except Exception as e:
-            logger.error(f"Error waiting for instance: {str(e)}")
-            return False
+        logger.error(f"Error waiting for instance: {result['failed'][db_instance_identifier]}")
+        return False
+    
+    def wait_for_instances(
+        self,
+        targets: Iterable[Target],
+        target_state: str = 'available',
+        **kwargs
+    ) -> Dict[str, Dict[Target, str]]:
+        """
+        Block until every target reached target_state ('available',
+        'stopped', 'deleted', ...), failed or timed out. See InstanceWaiter
+        for the keyword arguments.
+        """
+        return InstanceWaiter(self, targets, target_state, **kwargs).wait()
+    
+    async def wait_for_instances_async(
+        self,
+        targets: Iterable[Target],
+        target_state: str = 'available',
+        **kwargs
+    ) -> Dict[str, Dict[Target, str]]:
+        """wait_for_instances without blocking the event loop"""
+        return await InstanceWaiter(self, targets, target_state, **kwargs).wait_async()
         
-    def get_instance_details(self, db_instance_identifier: str) -> Optional[Dict]:
-        try:
-            response = self.client.describe_db_instances(
-                DBInstanceIdentifier=db_instance_identifier
-            )
+    def get_instance_details(
+        self,
+        db_instance_identifier: str,
+        region_name: Optional[str] = None
+    ) -> Optional[Dict]:
+        region_name = region_name or self.region
+        instance = self._cached_instance(region_name, db_instance_identifier)
+        if instance is None:
+            try:
+                response = self.get_client(region_name).describe_db_instances(
+                    DBInstanceIdentifier=db_instance_identifier
+                )
+            except ClientError as e:
+                # Only a missing instance is None, an error (denied, throttled...)
+                # says nothing about whether it exists
+                if e.response['Error']['Code'] == 'DBInstanceNotFound':
+                    logger.warning(f"Instance {db_instance_identifier} not found")
+                    return None
+                logger.error(f"Error retrieving instance details: {e.response['Error']['Message']}")
+                raise
             
             if not response['DBInstances']:
                 logger.warning(f"Instance {db_instance_identifier} not found")
                 return None
             
             instance = response['DBInstances'][0]
-            
-            # Extract key connection information
-            details = {
-                'identifier': instance['DBInstanceIdentifier'],
-                'status': instance['DBInstanceStatus'],
-                'engine': f"{instance['Engine']} {instance['EngineVersion']}",
-                'instance_class': instance['DBInstanceClass'],
-                'storage': f"{instance['AllocatedStorage']}GB",
-                'endpoint': instance.get('Endpoint', {}).get('Address', 'Not available yet'),
-                'port': instance.get('Endpoint', {}).get('Port', 'Not available yet'),
-                'availability_zone': instance.get('AvailabilityZone', 'Unknown'),
-                'publicly_accessible': instance['PubliclyAccessible'],
-                'backup_retention': instance['BackupRetentionPeriod'],
-                'created_time': instance.get('InstanceCreateTime', 'Unknown')
-            }
-            
+            self._cache_instance(region_name, instance)
             logger.info(f"Retrieved details for instance: {db_instance_identifier}")
-            return details
-            
-        except ClientError as e:
-            logger.error(f"Error retrieving instance details: {e.response['Error']['Message']}")
-            return None
         
-    def get_connection_string(self, db_instance_identifier: str) -> Optional[str]:
-        details = self.get_instance_details(db_instance_identifier)
+        return self._instance_details(instance)
+    
+    @staticmethod
+    def _instance_details(instance: Dict) -> Dict:
+        # Extract key connection information
+        return {
+            'identifier': instance['DBInstanceIdentifier'],
+            'status': instance['DBInstanceStatus'],
+            'engine': f"{instance['Engine']} {instance['EngineVersion']}",
+            'instance_class': instance['DBInstanceClass'],
+            'storage': f"{instance['AllocatedStorage']}GB",
+            'endpoint': instance.get('Endpoint', {}).get('Address', 'Not available yet'),
+            'port': instance.get('Endpoint', {}).get('Port', 'Not available yet'),
+            'availability_zone': instance.get('AvailabilityZone', 'Unknown'),
+            'publicly_accessible': instance['PubliclyAccessible'],
+            'backup_retention': instance['BackupRetentionPeriod'],
+            'created_time': instance.get('InstanceCreateTime', 'Unknown'),
+            'arn': instance.get('DBInstanceArn'),
+            # Set on replicas: identifier (ARN when in another region) of their source
+            'replica_of': instance.get('ReadReplicaSourceDBInstanceIdentifier'),
+            'read_replicas': instance.get('ReadReplicaDBInstanceIdentifiers', [])
+        }
+        
+    def get_connection_string(self, db_instance_identifier: str, region_name: Optional[str] = None) -> Optional[str]:
+        details = self.get_instance_details(db_instance_identifier, region_name)
         
         if not details or details['endpoint'] == 'Not available yet':
             logger.warning("Instance endpoint not available yet")
@@ -209,12 +382,13 @@ class RDSInfra:
         logger.info("Connection string template generated")
         return connection_string
     
-    def stop_instance(self, db_instance_identifier: str) -> Dict:
+    def stop_instance(self, db_instance_identifier: str, region_name: Optional[str] = None) -> Dict:
         try:
             logger.info(f"Stopping RDS instance: {db_instance_identifier}")
-            response = self.client.stop_db_instance(
+            response = self.get_client(region_name).stop_db_instance(
                 DBInstanceIdentifier=db_instance_identifier
             )
+            self.invalidate(db_instance_identifier, region_name)
             logger.info(f"Instance stop initiated: {db_instance_identifier}")
             return response
             
@@ -222,12 +396,13 @@ class RDSInfra:
             logger.error(f"Error stopping instance: {e.response['Error']['Message']}")
             raise
         
-    def start_instance(self, db_instance_identifier: str) -> Dict:
+    def start_instance(self, db_instance_identifier: str, region_name: Optional[str] = None) -> Dict:
         try:
             logger.info(f"Starting RDS instance: {db_instance_identifier}")
-            response = self.client.start_db_instance(
+            response = self.get_client(region_name).start_db_instance(
                 DBInstanceIdentifier=db_instance_identifier
             )
+            self.invalidate(db_instance_identifier, region_name)
             logger.info(f"Instance start initiated: {db_instance_identifier}")
             return response
             
@@ -235,11 +410,97 @@ class RDSInfra:
             logger.error(f"Error starting instance: {e.response['Error']['Message']}")
             raise
         
+    def create_read_replica(
+        self,
+        source_db_instance_identifier: str,
+        replica_identifier: str,
+        db_instance_class: Optional[str] = None,
+        publicly_accessible: bool = True,
+        region_name: Optional[str] = None,
+        source_region: Optional[str] = None
+    ) -> Dict:
+        """
+        Create a read replica of an instance. It gets its own endpoint, point
+        the application's read only traffic at it (DATABASE_REPLICA_URLS in
+        the FastAPI tutorial app).
+        
+        Args:
+            source_db_instance_identifier (str): Primary to replicate
+            replica_identifier (str): Identifier of the new replica
+            db_instance_class (str, optional): Defaults to the source's class
+            publicly_accessible (bool, optional): Defaults to True (learning setup)
+            region_name (str, optional): Region of the replica. Defaults to the default region.
+            source_region (str, optional): Region of the source, for cross-region replicas
+        
+        Raises:
+            ClientError: If the replica creation fails
+        """
+        region_name = region_name or self.region
+        params: Dict[str, Any] = {
+            'DBInstanceIdentifier': replica_identifier,
+            'SourceDBInstanceIdentifier': source_db_instance_identifier,
+            'PubliclyAccessible': publicly_accessible,
+            'Tags': [
+                {'Key': 'Environment', 'Value': 'Development'},
+                {'Key': 'ManagedBy', 'Value': 'boto3'},
+                {'Key': 'Purpose', 'Value': 'AWS-Learning'},
+                {'Key': 'ReplicaOf', 'Value': source_db_instance_identifier.split(':')[-1]}
+            ]
+        }
+        if db_instance_class:
+            params['DBInstanceClass'] = db_instance_class
+        
+        if source_region and source_region != region_name:
+            # Cross-region: the source is named by its ARN, boto3 signs the request for its region
+            if not source_db_instance_identifier.startswith('arn:'):
+                source = self.get_instance_details(source_db_instance_identifier, source_region)
+                if source is None:
+                    raise ValueError(f"Source instance {source_db_instance_identifier} not found in {source_region}")
+                params['SourceDBInstanceIdentifier'] = source['arn']
+            params['SourceRegion'] = source_region
+        
+        try:
+            logger.info(f"Creating read replica {replica_identifier} of {source_db_instance_identifier}")
+            response = self.get_client(region_name).create_db_instance_read_replica(**params)
+            self.invalidate(replica_identifier, region_name)
+            self.invalidate(source_db_instance_identifier.split(':')[-1], source_region or region_name)
+            logger.info(f"Read replica creation initiated: {replica_identifier}")
+            return response
+            
+        except ClientError as e:
+            logger.error(f"Error creating read replica: {e.response['Error']['Message']}")
+            raise
+        
+    def describe_read_replicas(
+        self,
+        source_db_instance_identifier: str,
+        region_name: Optional[str] = None
+    ) -> List[Dict]:
+        """Details of every replica of an instance, cross-region ones included"""
+        source = self.get_instance_details(source_db_instance_identifier, region_name)
+        if source is None:
+            return []
+        
+        replicas = []
+        for replica in source['read_replicas']:
+            replica_region = region_name
+            if replica.startswith('arn:'):
+                # arn:aws:rds:<region>:<account>:db:<identifier>
+                parts = replica.split(':')
+                replica_region, replica = parts[3], parts[-1]
+            details = self.get_instance_details(replica, replica_region)
+            if details:
+                replicas.append(details)
+        
+        logger.info(f"Found {len(replicas)} read replicas of {source_db_instance_identifier}")
+        return replicas
+        
     def delete_instance(
         self,
         db_instance_identifier: str,
         skip_final_snapshot: bool = True,
-        final_snapshot_identifier: Optional[str] = None
+        final_snapshot_identifier: Optional[str] = None,
+        region_name: Optional[str] = None
     ) -> Dict:
         try:
             logger.warning(f"Deleting RDS instance: {db_instance_identifier}")
@@ -252,7 +513,8 @@ class RDSInfra:
             if not skip_final_snapshot and final_snapshot_identifier:
                 params['FinalDBSnapshotIdentifier'] = final_snapshot_identifier
             
-            response = self.client.delete_db_instance(**params)
+            response = self.get_client(region_name).delete_db_instance(**params)
+            self.invalidate(db_instance_identifier, region_name)
             logger.warning(f"Instance deletion initiated: {db_instance_identifier}")
             return response
             
@@ -260,25 +522,301 @@ class RDSInfra:
             logger.error(f"Error deleting instance: {e.response['Error']['Message']}")
             raise
         
-    def list_all_instances(self) -> list:
-        try:
-            response = self.client.describe_db_instances()
-            instances = [
-                {
-                    'identifier': db['DBInstanceIdentifier'],
-                    'status': db['DBInstanceStatus'],
-                    'engine': f"{db['Engine']} {db['EngineVersion']}",
-                    'endpoint': db.get('Endpoint', {}).get('Address', 'Not available')
-                }
-                for db in response['DBInstances']
-            ]
-            
-            logger.info(f"Found {len(instances)} RDS instances")
-            return instances
+    def list_all_instances(
+        self,
+        engine: Optional[str] = None,
+        tags: Optional[Dict[str, str]] = None,
+        region_name: Optional[str] = None,
+        refresh: bool = False
+    ) -> list:
+        """
+        Summary of every instance (see iter_instances for the filters). The
+        listing is cached for cache_ttl seconds, refresh=True skips the cache.
+        """
+        region_name = region_name or self.region
+        key = (region_name, engine, tuple(sorted((tags or {}).items())))
+        with self._cache_lock:
+            entry = self._listings.get(key)
+        
+        if entry and entry[0] > time.monotonic() and not refresh:
+            records = entry[1]
+        else:
+            try:
+                records = list(self.iter_instances(engine=engine, tags=tags, region_name=region_name))
+            except ClientError as e:
+                logger.error(f"Error listing instances: {e.response['Error']['Message']}")
+                return []
+            if self.cache_ttl > 0:
+                with self._cache_lock:
+                    self._listings[key] = (time.monotonic() + self.cache_ttl, records)
+        
+        instances = [
+            {
+                'identifier': db['DBInstanceIdentifier'],
+                'status': db['DBInstanceStatus'],
+                'engine': f"{db['Engine']} {db['EngineVersion']}",
+                'endpoint': db.get('Endpoint', {}).get('Address', 'Not available')
+            }
+            for db in records
+        ]
+        
+        logger.info(f"Found {len(instances)} RDS instances")
+        return instances
+        
+    # Fleet operations
+    #
+    # Each takes many targets, an identifier in the default region or a
+    # (region, identifier) tuple, runs the single instance operation for all of
+    # them over at most max_workers threads and never raises for one instance:
+    # the result is {'succeeded': {target: response}, 'failed': {target: error}}.
+    
+    @staticmethod
+    def _split_target(target: Target) -> Tuple[Optional[str], str]:
+        if isinstance(target, tuple):
+            return target
+        return None, target
+    
+    def _run_fleet(
+        self,
+        operation: str,
+        func: Callable[..., Any],
+        jobs: List[Tuple[Target, Dict[str, Any]]]
+    ) -> Dict[str, Dict[Target, Any]]:
+        results: Dict[str, Dict[Target, Any]] = {'succeeded': {}, 'failed': {}}
+        if not jobs:
+            return results
+        
+        logger.info(f"{operation}: {len(jobs)} instances, {self.max_workers} workers")
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            futures = {pool.submit(func, **kwargs): target for target, kwargs in jobs}
+            for future in as_completed(futures):
+                target = futures[future]
+                try:
+                    results['succeeded'][target] = future.result()
+                except ClientError as e:
+                    results['failed'][target] = f"{e.response['Error']['Code']} - {e.response['Error']['Message']}"
+                except Exception as e:
+                    logger.error(f"{operation} failed for {target}: {str(e)}")
+                    results['failed'][target] = str(e)
+        
+        logger.info(
+            f"{operation}: {len(results['succeeded'])} succeeded, {len(results['failed'])} failed"
+        )
+        return results
+    
+    def _run_for_targets(
+        self,
+        operation: str,
+        func: Callable[..., Any],
+        targets: Iterable[Target],
+        **kwargs
+    ) -> Dict[str, Dict[Target, Any]]:
+        jobs = []
+        for target in targets:
+            region_name, db_instance_identifier = self._split_target(target)
+            jobs.append((target, dict(kwargs, db_instance_identifier=db_instance_identifier, region_name=region_name)))
+        return self._run_fleet(operation, func, jobs)
+    
+    def create_database_instances(self, specs: Iterable[Dict[str, Any]]) -> Dict[str, Dict[Target, Any]]:
+        """
+        Create many instances. Each spec holds the create_database_instance
+        arguments (region_name included), results are keyed like targets.
+        """
+        jobs = []
+        for spec in specs:
+            region_name = spec.get('region_name')
+            identifier = spec['db_instance_identifier']
+            jobs.append(((region_name, identifier) if region_name else identifier, spec))
+        return self._run_fleet("Create", self.create_database_instance, jobs)
+    
+    def start_instances(self, targets: Iterable[Target]) -> Dict[str, Dict[Target, Any]]:
+        return self._run_for_targets("Start", self.start_instance, targets)
+    
+    def stop_instances(self, targets: Iterable[Target]) -> Dict[str, Dict[Target, Any]]:
+        return self._run_for_targets("Stop", self.stop_instance, targets)
+    
+    def delete_instances(self, targets: Iterable[Target], skip_final_snapshot: bool = True) -> Dict[str, Dict[Target, Any]]:
+        """Delete many instances, final snapshots are named <identifier>-final"""
+        jobs = []
+        for target in targets:
+            region_name, db_instance_identifier = self._split_target(target)
+            jobs.append((target, {
+                'db_instance_identifier': db_instance_identifier,
+                'skip_final_snapshot': skip_final_snapshot,
+                'final_snapshot_identifier': f"{db_instance_identifier}-final",
+                'region_name': region_name
+            }))
+        return self._run_fleet("Delete", self.delete_instance, jobs)
+    
+    def create_read_replicas(
+        self,
+        source_db_instance_identifier: str,
+        replica_identifiers: Iterable[str],
+        **kwargs
+    ) -> Dict[str, Dict[Target, Any]]:
+        """Create several replicas of one instance at once, see create_read_replica for kwargs"""
+        jobs = [
+            (replica, dict(kwargs, source_db_instance_identifier=source_db_instance_identifier, replica_identifier=replica))
+            for replica in replica_identifiers
+        ]
+        return self._run_fleet("Create replica", self.create_read_replica, jobs)
+    
+    def describe_instances(self, targets: Iterable[Target]) -> Dict[str, Dict[Target, Any]]:
+        def describe(db_instance_identifier: str, region_name: Optional[str]) -> Dict:
+            details = self.get_instance_details(db_instance_identifier, region_name)
+            if details is None:
+                raise LookupError(f"Instance {db_instance_identifier} not found")
+            return details
+        
+        return self._run_for_targets("Describe", describe, targets)
+
+class InstanceWaiter:
+    """
+    Waits for many instances at once. Every poll is a single
+    describe_db_instances per region (filtered on the pending instances), and
+    the delay between polls grows from initial_delay to max_delay: most state
+    changes either happen quickly (stop, start) or take many minutes (create).
+    
+    The result has the shape of the fleet operations: {'succeeded': {target:
+    status}, 'failed': {target: status}}, where instances that ended in a
+    failed state, disappeared, or were still on their way at the timeout fail.
+    
+    DescribeDBInstances is eventually consistent: right after a create an
+    instance can be missing from it for a little while. A missing instance
+    only fails once it stayed missing for not_found_grace seconds, except when
+    waiting for 'deleted', where missing is the state we wait for.
+    
+    A poll that is throttled or hits a server error is tried again at the
+    next one. Any other API error (access denied, ...) is raised.
+    
+    Attributes:
+        on_progress: called with (target, status) whenever a status changes
+    """
+    
+    def __init__(
+        self,
+        rds: RDSInfra,
+        targets: Iterable[Target],
+        target_state: str = 'available',
+        timeout: float = 1800,
+        initial_delay: float = 5,
+        max_delay: float = 60,
+        backoff: float = 1.5,
+        not_found_grace: float = 60,
+        on_progress: Optional[Callable[[Target, str], None]] = None
+    ):
+        self.rds = rds
+        self.target_state = target_state
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.not_found_grace = not_found_grace
+        self.on_progress = on_progress
+        self.pending: Dict[Target, Optional[str]] = {target: None for target in targets}
+        # target -> time.monotonic() of the first poll it was missing from
+        self._missing_since: Dict[Target, float] = {}
+        self.results: Dict[str, Dict[Target, str]] = {'succeeded': {}, 'failed': {}}
+        self._delay = initial_delay
+        self._deadline = 0.0
+    
+    def _describe(self, region_name: str, identifiers: List[str]) -> Dict[str, str]:
+        """Current status of the identifiers found, one call per 100 of them"""
+        paginator = self.rds.get_client(region_name).get_paginator('describe_db_instances')
+        statuses = {}
+        for i in range(0, len(identifiers), FILTER_VALUES_LIMIT):
+            batch = identifiers[i:i + FILTER_VALUES_LIMIT]
+            for page in paginator.paginate(Filters=[{'Name': 'db-instance-id', 'Values': batch}]):
+                for instance in page['DBInstances']:
+                    self.rds._cache_instance(region_name, instance)
+                    statuses[instance['DBInstanceIdentifier']] = instance['DBInstanceStatus']
+        return statuses
+    
+    def _finish(self, target: Target, status: str, succeeded: bool) -> None:
+        del self.pending[target]
+        self.results['succeeded' if succeeded else 'failed'][target] = status
+        if not succeeded:
+            logger.error(f"Instance {target} won't reach {self.target_state}: {status}")
+    
+    def _missing_status(self, target: Target) -> Optional[str]:
+        """Status of a target describe didn't return, None while it is still given time to show up"""
+        if self.target_state == 'deleted':
+            return 'deleted'
+        now = time.monotonic()
+        if now - self._missing_since.setdefault(target, now) < self.not_found_grace:
+            return None
+        self._missing_since.pop(target)
+        return 'deleted' if self.pending[target] is not None else 'not found'
+    
+    def poll(self) -> bool:
+        """Refresh the status of the pending instances, True once none is left"""
+        by_region: Dict[str, Dict[str, Target]] = {}
+        for target in self.pending:
+            region_name, identifier = RDSInfra._split_target(target)
+            by_region.setdefault(region_name or self.rds.region, {})[identifier] = target
+        
+        for region_name, targets in by_region.items():
+            try:
+                statuses = self._describe(region_name, list(targets))
+            except ClientError as e:
+                # Access denied, a bad region...: polling again won't help
+                if not is_transient(e):
+                    raise
+                # Throttling is already retried by the client, try again next poll
+                logger.warning(f"Error polling instances in {region_name}: {e.response['Error']['Message']}")
+                continue
             
-        except ClientError as e:
-            logger.error(f"Error listing instances: {e.response['Error']['Message']}")
-            return []
+            for identifier, target in targets.items():
+                status = statuses.get(identifier)
+                if status is None:
+                    status = self._missing_status(target)
+                    if status is None:
+                        continue
+                else:
+                    self._missing_since.pop(target, None)
+                if status != self.pending[target]:
+                    self.pending[target] = status
+                    if self.on_progress:
+                        self.on_progress(target, status)
+                if status == self.target_state:
+                    self._finish(target, status, succeeded=True)
+                elif status in FAILED_STATES or status in ('deleted', 'not found'):
+                    self._finish(target, status, succeeded=False)
+        
+        return not self.pending
+    
+    def next_delay(self) -> float:
+        """Seconds until the next poll, never past the deadline"""
+        # Jitter keeps waiters started together from polling in lockstep
+        delay = self._delay * random.uniform(0.8, 1.2)
+        self._delay = min(self._delay * self.backoff, self.max_delay)
+        return max(0.0, min(delay, self._deadline - time.monotonic()))
+    
+    def _timed_out(self) -> bool:
+        if time.monotonic() < self._deadline:
+            return False
+        for target, status in list(self.pending.items()):
+            self._finish(target, f"timed out ({status or 'unknown'})", succeeded=False)
+        return True
+    
+    def _start(self) -> None:
+        logger.info(f"Waiting for {len(self.pending)} instances to be {self.target_state}...")
+        self._delay = self.initial_delay
+        self._deadline = time.monotonic() + self.timeout
+    
+    def wait(self) -> Dict[str, Dict[Target, str]]:
+        self._start()
+        while not self.poll() and not self._timed_out():
+            time.sleep(self.next_delay())
+        return self.results
+    
+    async def wait_async(self) -> Dict[str, Dict[Target, str]]:
+        self._start()
+        # boto3 is blocking, the polls run in a thread
+        while not await asyncio.to_thread(self.poll) and not self._timed_out():
+            await asyncio.sleep(self.next_delay())
+        return self.results
+    
 
 def main():
     rds = RDSInfra(region_name='mx-central-1')
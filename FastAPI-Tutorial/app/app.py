@@ -1,25 +1,61 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Query, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from typing import Optional
-from app.schemas import PostCreate, PostResponse, UserRead, UserCreate, UserUpdate
-from app.db import Post, User, create_db_and_tables, get_async_session
+from app.schemas import PostCreate, PostResponse, FeedResponse, UserRead, UserCreate, UserUpdate, BatchDeleteRequest
+from app.responses import FastJSONResponse, dumps
+from app.db import Post, User, create_db_and_tables, get_async_session, engine, replicas
+from app.pagination import FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE
+from app.feed import load_feed_page, page_version
+from app.search import search_posts
+from app.http_cache import make_etag, etag_matches, not_modified
+from app.compression import CompressionMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
 from contextlib import asynccontextmanager
-from app.images import imagekit
-from imagekitio.models.UploadFileRequestOptions import UploadFileRequestOptions
-import shutil
+from fastapi.staticfiles import StaticFiles
+from app.config import settings
+from app.storage import StorageBackend, StoredFile, UploadIncomplete, UploadNotFound, UploadOffsetMismatch, get_storage
+from app.uploads import upload_slot
+from app.ratelimit import rate_limit, user_upload_slot
+from app.jobs import enqueue, job_queue
+from app.cache import get_feed_page, set_feed_page, invalidate_feed
+from app.metrics import MetricsMiddleware, registry
+from app.shutdown import DrainMiddleware, drain
+from app.startup import startup_timer
+import asyncio
 import os
 import uuid
-import tempfile
-from app.users import auth_backend, current_active_user, fastapi_users
-
+from app.users import auth_backend, current_active_user, current_active_user_from_db, fastapi_users, get_jwt_strategy
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    # Interpreter start, imports and server setup
+    startup_timer.mark("import")
+    # serve.py already did it once before starting the workers
+    if settings.run_startup_tasks:
+        await create_db_and_tables()
+    await job_queue.start()
+    if settings.metrics_dir:
+        registry.start_sharing(settings.metrics_dir, settings.metrics_share_interval)
+    drain.install()
+    startup_timer.mark("lifespan")
+    startup_timer.report()
     yield
+    # Running jobs get whatever is left of the drain deadline, see app/shutdown.py
+    await job_queue.stop(timeout=drain.remaining())
+    await registry.stop_sharing()
+    await engine.dispose()
+    await replicas.dispose()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.gzip_level,
+    brotli_quality=settings.brotli_quality
+)
+app.add_middleware(DrainMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(fastapi_users.get_auth_router(auth_backend), prefix='/auth/jwt', tags=["auth"])
 app.include_router(fastapi_users.get_register_router(UserRead, UserCreate), prefix="/auth", tags=["auth"])
@@ -27,89 +63,275 @@ app.include_router(fastapi_users.get_reset_password_router(), prefix="/auth", ta
 app.include_router(fastapi_users.get_verify_router(UserRead), prefix="/auth", tags=["auth"])
 app.include_router(fastapi_users.get_users_router(UserRead,UserUpdate), prefix="/users", tags=["users"])
 
+@app.post("/auth/jwt/refresh", tags=["auth"])
+async def refresh_token(user: User = Depends(current_active_user_from_db)):
+    """
+    A new token with fresh claims for a still valid one. With AUTH_STATELESS
+    claims are only trusted for AUTH_CLAIMS_MAX_AGE seconds, refreshing that
+    often keeps every request off the user table but this one.
+    """
+    return await auth_backend.login(get_jwt_strategy(), user)
+
+# With the local storage backend the app serves the uploaded files itself
+if settings.storage_backend == "local":
+    os.makedirs(settings.local_storage_dir, exist_ok=True)
+    app.mount(settings.local_storage_url, StaticFiles(directory=settings.local_storage_dir), name="media")
+
+def new_post(user: User, caption: str, file: UploadFile, stored: StoredFile) -> Post:
+    return Post(
+        # All this are already part of the Post object at db.py
+        user_id = user.id,
+        caption = caption,
+        url = stored.url,
+        file_type = "video" if (file.content_type and file.content_type.startswith("video/")) else "image",
+        file_name = stored.name,
+        file_id = stored.file_id,
+        # Thumbnail and content sniffing happen in the background, see app/jobs.py
+        status = "processing"
+    )
+
+@app.get("/livez", include_in_schema=False)
+async def livez():
+    return {"status": "alive"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    # Fails as soon as shutdown begins so no new traffic is routed here
+    if drain.draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Request and database metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # This is like CREATE
-@app.post("/upload")
+upload_limits = [
+    Depends(rate_limit("upload", settings.upload_rate_limit, settings.upload_rate_burst)),
+    Depends(user_upload_slot)
+]
+
+async def batch_file_count(request: Request) -> int:
+    """Files in an /upload/batch request, each takes an upload token"""
+    form = await request.form()
+    return min(len(form.getlist("files")), settings.max_batch_size) or 1
+
+batch_upload_limits = [
+    Depends(rate_limit("upload", settings.upload_rate_limit, settings.upload_rate_burst, cost=batch_file_count)),
+    Depends(user_upload_slot)
+]
+
+@app.post("/upload", response_model=PostResponse, dependencies=upload_limits)
 async def upload_file(
     file: UploadFile = File(...),
     caption: str = Form(""),
+    upload_id: Optional[str] = Form(None),
+    offset: int = Form(0, ge=0),
     user: User = Depends(current_active_user),
-    session: AsyncSession = Depends(get_async_session)
+    session: AsyncSession = Depends(get_async_session),
+    storage: StorageBackend = Depends(get_storage)
 ):
-    temp_file_path = None
-    
+    """
+    Upload one file. With a resumable storage backend (local) a failed
+    transfer answers with its upload_id and the bytes received: send the
+    rest of the file with the same upload_id and offset=received to finish it.
+    """
+    if upload_id is not None and not storage.resumable:
+        raise HTTPException(status_code=400, detail="This storage backend can't resume uploads")
     try:
-        # ensure filename is a str (fallback to empty string) before calling splitext
-        ext = os.path.splitext(file.filename or "")[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_file:
-            temp_file_path = temp_file.name
-            shutil.copyfileobj(file.file, temp_file)
-            
-        upload_result = imagekit.upload_file(
-            file=open(temp_file_path, "rb"),
-            file_name=file.filename,
-            options=UploadFileRequestOptions(
-                use_unique_file_name=True,
-                tags=["backend-upload"]
-            )
+        async with upload_slot():
+            if storage.resumable:
+                stored = await storage.upload(
+                    file, file.filename, file.content_type,
+                    upload_id=upload_id or uuid.uuid4().hex,
+                    offset=offset,
+                    owner=str(user.id)
+                )
+            else:
+                stored = await storage.upload(file, file.filename, file.content_type)
+        
+        # Dependency injection
+        post = new_post(user, caption, file, stored)
+        session.add(post)
+        await session.flush() # Assigns post.id so the job can point at it
+        enqueue(session, "process_upload", post_id=str(post.id))
+        await session.commit()
+        await session.refresh(post) # This is to create the missing data (id and createdat)
+        await invalidate_feed()
+        await replicas.wrote(user.id)
+        job_queue.notify()
+        return post
+
+    except HTTPException:
+        raise
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Unknown upload_id")
+    except UploadIncomplete as e:
+        raise HTTPException(
+            status_code=409 if isinstance(e, UploadOffsetMismatch) else 500,
+            detail={"error": str(e), "upload_id": e.upload_id, "received": e.received}
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await file.close()
+
+@app.post("/upload/batch", dependencies=batch_upload_limits)
+async def upload_files(
+    files: list[UploadFile] = File(...),
+    captions: list[str] = Form([]),
+    user: User = Depends(current_active_user),
+    session: AsyncSession = Depends(get_async_session),
+    storage: StorageBackend = Depends(get_storage)
+):
+    """
+    Upload several files at once. Transfers run concurrently, up to
+    MAX_UPLOADS_PER_USER of them (and still bounded by MAX_CONCURRENT_UPLOADS),
+    and all the posts are inserted in one transaction. Each file counts
+    against the upload rate limit. captions[i] goes with files[i], missing
+    captions are empty.
+    """
+    if len(files) > settings.max_batch_size:
+        raise HTTPException(status_code=413, detail=f"At most {settings.max_batch_size} files per batch")
+    
+    # One user's batch doesn't get to take every upload slot of the worker
+    batch_slots = asyncio.Semaphore(settings.max_uploads_per_user or len(files))
+    
+    async def transfer(file: UploadFile):
+        async with batch_slots, upload_slot():
+            return await storage.upload(file, file.filename, file.content_type)
+    
+    try:
+        transfers = await asyncio.gather(*(transfer(file) for file in files), return_exceptions=True)
         
-        if upload_result.response_metadata.http_status_code == 200:
-            # Dependency injection
-            post = Post(
-                # All this are already part of the Post object at db.py
-                user_id = user.id,
-                caption = caption,
-                url = upload_result.url,
-                file_type = "video" if (file.content_type and file.content_type.startswith("/video")) else "image",
-                file_name = upload_result.name
-            )
+        results = []
+        posts = []
+        for index, (file, stored) in enumerate(zip(files, transfers)):
+            if isinstance(stored, BaseException):
+                detail = stored.detail if isinstance(stored, HTTPException) else str(stored)
+                results.append({"file_name": file.filename, "success": False, "error": detail})
+                continue
+            caption = captions[index] if index < len(captions) else ""
+            post = new_post(user, caption, file, stored)
             session.add(post)
-            await session.commit()
-            await session.refresh(post) # This is to create the missing data (id and createdat)
-            return post
-
+            posts.append(post)
+            results.append({"file_name": file.filename, "success": True, "post": post})
+        
+        if posts:
+            await session.flush() # Assigns the ids so the jobs can point at them
+            for post in posts:
+                enqueue(session, "process_upload", post_id=str(post.id))
+            try:
+                await session.commit()
+            except Exception:
+                # Nothing was saved, don't leave the transferred files behind
+                await asyncio.gather(*(storage.delete(post.file_id) for post in posts), return_exceptions=True)
+                raise
+            await invalidate_feed()
+            await replicas.wrote(user.id)
+            job_queue.notify()
+        
+        for result in results:
+            if result["success"]:
+                result["post"] = {"id": str(result["post"].id), "url": result["post"].url}
+        
+        return {"uploaded": len(posts), "failed": len(files) - len(posts), "results": results}
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-        file.file.close()
+        for file in files:
+            await file.close()
+
+# The feed is per user: caches keep it private and revalidate it on every use
+FEED_CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
 
-@app.get("/feed")
+@app.get(
+    "/feed",
+    response_model=FeedResponse,
+    dependencies=[Depends(rate_limit("feed", settings.feed_rate_limit, settings.feed_rate_burst))]
+)
 async def get_feed(
-    session: AsyncSession = Depends(get_async_session),
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+    stream: bool = False,
     user: User = Depends(current_active_user)
 ):
-    # Execute a query selecting the 'Post' table and ordering by 'created_at' field
-    result = await session.execute(select(Post).order_by(Post.created_at.desc()))
-    # List comprehension
-    posts = [row[0] for row in result.all()]
+    # Right after this user uploaded or deleted, a replica (or a page cached
+    # from one) may not show it yet: skip both and read from the primary
+    primary = await replicas.recently_wrote(user.id)
+    # Pages are the same for every user, so they are cached without is_owner
+    page = None if primary else await get_feed_page(cursor, limit)
+    if page is None:
+        # Read only: served by a read replica when there are some. Right after
+        # anyone's change the page about to be cached comes from the primary
+        primary = primary or await replicas.feed_recently_changed()
+        page = await replicas.read(lambda session: load_feed_page(session, cursor, limit), primary=primary)
+        await set_feed_page(cursor, limit, page)
     
-    result = await session.execute(select(User))
-    users = [row[0] for row in result.all()]
-    user_dict = {u.id: u.email for u in users}
+    # is_owner makes the body differ per user, so the user is part of the ETag.
+    # A client polling an unchanged page gets a 304 without it being serialized.
+    etag = make_etag(page.get("version") or page_version(page), user.id, stream)
+    if etag_matches(request, etag):
+        return not_modified(etag, FEED_CACHE_HEADERS)
+    headers = {"ETag": etag, **FEED_CACHE_HEADERS}
     
-    posts_data = []
+    # A page from a shared (redis) cache has string ids, one from memory has UUIDs
+    owner_ids = {user.id, str(user.id)}
     
-    for post in posts:
-        posts_data.append(
-            {
-                "id": str(post.id),
-                "user_id": str(post.user_id),
-                "caption": post.caption,
-                "url": post.url,
-                "file_type": post.file_type,
-                "file_name": post.file_name,
-                "created_at": post.created_at.isoformat(),
-                "is_owner": post.user_id == user.id,
-                "email": user_dict.get(post.user_id, "Unknown")
-            }
-        )
+    def with_owner(post: dict) -> dict:
+        return {**post, "is_owner": post["user_id"] in owner_ids}
+    
+    if stream:
+        # NDJSON: one post per line, sent as soon as it is serialized
+        async def generate():
+            for post in page["posts"]:
+                yield dumps(with_owner(post)) + b"\n"
         
-    return {"posts": posts_data}
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        return StreamingResponse(generate(), media_type="application/x-ndjson", headers=headers)
+    
+    # Returned as a response directly: no jsonable_encoder / validation pass over every post
+    return FastJSONResponse(
+        {"posts": [with_owner(post) for post in page["posts"]], "next_cursor": page["next_cursor"]},
+        headers=headers
+    )
+
+@app.get(
+    "/search",
+    response_model=FeedResponse,
+    dependencies=[Depends(rate_limit("search", settings.feed_rate_limit, settings.feed_rate_burst))]
+)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+    user: User = Depends(current_active_user)
+):
+    """Posts whose caption contains every word of q, best match first"""
+    page = await replicas.read(
+        lambda session: search_posts(session, q, cursor, limit),
+        primary=await replicas.recently_wrote(user.id)
+    )
+    owner_ids = {user.id, str(user.id)}
+    return FastJSONResponse({
+        "posts": [{**post, "is_owner": post["user_id"] in owner_ids} for post in page["posts"]],
+        "next_cursor": page["next_cursor"]
+    })
 
 @app.delete("/post/{post_id}")
-async def delete_post(post_id: str, session: AsyncSession = Depends(get_async_session), user: User = Depends(current_active_user)):
+async def delete_post(
+    post_id: str,
+    session: AsyncSession = Depends(get_async_session),
+    user: User = Depends(current_active_user)
+):
     try:
         post_uuid = uuid.UUID(post_id)
         
@@ -123,9 +345,80 @@ async def delete_post(post_id: str, session: AsyncSession = Depends(get_async_se
             raise HTTPException(status_code=403, detail="You don't have permission to delete this post")
         
         await session.delete(post)
+        # The file is removed from storage in the background, with retries
+        if post.file_id:
+            enqueue(session, "delete_file", file_id=post.file_id)
         await session.commit()
+        await invalidate_feed()
+        await replicas.wrote(user.id)
+        job_queue.notify()
         
         return {"success": True, "message": "Post deleted", "deleted_post": str(post.id)}
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/post/batch-delete")
+async def delete_posts(
+    request: BatchDeleteRequest,
+    session: AsyncSession = Depends(get_async_session),
+    user: User = Depends(current_active_user)
+):
+    """Delete many of the user's posts with a single DELETE, reporting on each id"""
+    if len(request.post_ids) > settings.max_batch_size:
+        raise HTTPException(status_code=413, detail=f"At most {settings.max_batch_size} posts per batch")
+    
+    post_uuids = {}
+    for post_id in request.post_ids:
+        try:
+            post_uuids[post_id] = uuid.UUID(post_id)
+        except ValueError:
+            pass
+    
+    try:
+        deleted = {}
+        existing = set()
+        if post_uuids:
+            # DELETE ... WHERE id IN (...) AND user_id = :uid, other users' posts are never touched
+            result = await session.execute(
+                delete(Post)
+                .where(Post.id.in_(post_uuids.values()), Post.user_id == user.id)
+                .returning(Post.id, Post.file_id)
+            )
+            deleted = {post_id: file_id for post_id, file_id in result.all()}
+            
+            # The file is removed from storage in the background, with retries
+            for file_id in deleted.values():
+                if file_id:
+                    enqueue(session, "delete_file", file_id=file_id)
+            
+            # Only when something was left behind: tell "not yours" apart from "not there"
+            leftover = [post_uuid for post_uuid in post_uuids.values() if post_uuid not in deleted]
+            if leftover:
+                existing = set((await session.execute(select(Post.id).where(Post.id.in_(leftover)))).scalars())
+            
+            await session.commit()
+            if deleted:
+                await invalidate_feed()
+                await replicas.wrote(user.id)
+                job_queue.notify()
+        
+        # One entry per requested id, in the order they were sent
+        results = {}
+        for post_id in request.post_ids:
+            post_uuid = post_uuids.get(post_id)
+            if post_uuid is None:
+                results[post_id] = {"success": False, "error": "Invalid post id"}
+            elif post_uuid in deleted:
+                results[post_id] = {"success": True}
+            elif post_uuid in existing:
+                results[post_id] = {"success": False, "error": "You don't have permission to delete this post"}
+            else:
+                results[post_id] = {"success": False, "error": "Post not found"}
+        
+        return {"deleted": len(deleted), "results": results}
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
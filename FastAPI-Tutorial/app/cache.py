@@ -0,0 +1,127 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.config import settings
+from app.responses import dumps
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with a TTL per entry. Each worker process has its
+    own copy, so invalidations only reach the process that made them and the
+    TTL is what bounds staleness across workers. Use the redis backend to
+    share one cache between workers and replicas.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else 0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class RedisCache:
+    """Same interface as MemoryCache, backed by Redis (or anything speaking its protocol)"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package: poetry add redis")
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        # Same encoder as the responses, so UUIDs and datetimes in feed pages are fine
+        await self.client.set(key, dumps(value), ex=int(ttl) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(key)
+
+
+def create_cache(max_entries: int):
+    if settings.cache_backend == "redis":
+        return RedisCache(settings.cache_url)
+    if settings.cache_backend == "memory":
+        return MemoryCache(max_entries)
+    raise RuntimeError(f"Unknown CACHE_BACKEND: {settings.cache_backend}")
+
+
+cache = create_cache(settings.cache_max_entries)
+# Decoded tokens get their own LRU: one per active session, they would
+# otherwise push feed pages out of the shared one (and the other way round)
+token_cache = create_cache(settings.token_cache_max_entries)
+
+
+# Feed pages
+#
+# Page keys include a generation. Anything that changes what the feed shows
+# replaces it, which orphans every cached page at once (they age out via the
+# TTL / LRU) without having to know which cursors were cached.
+#
+# Generations are random rather than a counter: the generation key lives in
+# the same LRU (or Redis) and can be evicted, and a counter starting over
+# would bring back pages cached under the old numbers as if they were fresh.
+
+FEED_GENERATION_KEY = "feed:generation"
+# Set for REPLICA_READ_AFTER_WRITE seconds after every change, see
+# ReplicaRouter.feed_recently_changed
+FEED_CHANGED_KEY = "feed:changed"
+
+
+async def _feed_key(cursor: Optional[str], limit: int) -> str:
+    generation = await cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        await cache.set(FEED_GENERATION_KEY, generation)
+    return f"feed:{generation}:{cursor or ''}:{limit}"
+
+
+async def get_feed_page(cursor: Optional[str], limit: int) -> Optional[dict]:
+    return await cache.get(await _feed_key(cursor, limit))
+
+
+async def set_feed_page(cursor: Optional[str], limit: int, page: dict) -> None:
+    # FEED_CACHE_TTL=0 turns feed caching off
+    if settings.feed_cache_ttl <= 0:
+        return
+    await cache.set(await _feed_key(cursor, limit), page, ttl=settings.feed_cache_ttl)
+
+
+async def invalidate_feed() -> None:
+    # Marked before the new generation: a page read in between must not be
+    # cached from a replica that hasn't seen the change yet
+    if settings.replica_read_after_write > 0:
+        await cache.set(FEED_CHANGED_KEY, True, ttl=settings.replica_read_after_write)
+    await cache.set(FEED_GENERATION_KEY, uuid.uuid4().hex)
+
+
+# User records
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
@@ -0,0 +1,95 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+# brotli is a dependency: smaller than gzip at the same CPU cost. An install
+# that skipped it still works, only gzip is offered then.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Formats that are compressed already: gzip or brotli can't make them smaller,
+# they only burn CPU and turn ranged/streamed media into chunked responses
+INCOMPRESSIBLE_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-brotli",
+    "application/zstd",
+    "application/pdf",
+    "application/octet-stream",
+)
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    # SVG is XML text, the one image type that shrinks well
+    if content_type.startswith("image/svg+xml"):
+        return True
+    return not content_type.startswith(INCOMPRESSIBLE_CONTENT_TYPES)
+
+
+class SkipIncompressible:
+    """Mixin for Starlette responders: already compressed content types go out as they are"""
+
+    async def send_with_compression(self, message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            self.passthrough = not is_compressible(content_type)
+        if self.passthrough:
+            await self.send(message)
+            return
+        await super().send_with_compression(message)
+
+
+class GZipMediaResponder(SkipIncompressible, GZipResponder):
+    pass
+
+
+class BrotliResponder(SkipIncompressible, IdentityResponder):
+    """Starlette's responder logic (size threshold, streaming) with a brotli compressor"""
+
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            # Flush so every streamed chunk reaches the client as it is produced
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least minimum_size bytes with brotli when the
+    client accepts it (and the package is installed), gzip otherwise. Small
+    responses, 304s and already compressed formats (images, video, archives)
+    go out as they are, compressing them costs more than it saves.
+    """
+
+    def __init__(self, app, minimum_size: int, gzip_level: int, brotli_quality: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif "gzip" in accepted:
+            responder = GZipMediaResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
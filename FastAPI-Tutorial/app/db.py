@@ -1,15 +1,22 @@
 from collections.abc import AsyncGenerator
 import uuid
 
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, Integer, JSON, event, inspect, text
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, relationship, make_transient_to_detached
 from datetime import datetime
 from fastapi_users.db import SQLAlchemyUserDatabase, SQLAlchemyBaseUserTableUUID
+from fastapi_users_db_sqlalchemy.generics import GUID
 from fastapi import Depends
 
-DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+from app.cache import cache, invalidate_feed, user_key
+from app.config import settings
+from app.metrics import instrument_engine
+from app.replicas import ReplicaRouter
+
+DATABASE_URL = settings.database_url
 
 class Base(DeclarativeBase):
     pass
@@ -26,23 +33,206 @@ class Post(Base):
     __tablename__ = "posts"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
+    # Same type as User.id so the feed can join on it (UUID and GUID store differently on SQLite)
+    user_id = Column(GUID, ForeignKey("user.id"), nullable=False)
     caption = Column(Text)
     url = Column(String, nullable=False)
     file_type =  Column(String, nullable=False)
     file_name = Column(String, nullable=False)
+    # Id of the file in the storage backend, needed to delete it later
+    file_id = Column(String, nullable=True)
+    # "processing" until the background job has sniffed the file and made a thumbnail
+    status = Column(String, nullable=False, default="ready")
+    thumbnail_url = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="posts")
+
+
+# The feed walks posts newest first and pages with a (created_at, id) cursor,
+# this index lets every page be a range scan instead of sorting the whole table
+Index("ix_posts_created_at_id", Post.created_at.desc(), Post.id)
+
+
+# posts.user_id used to be a postgresql UUID, which SQLite stores as 32 hex
+# digits, while user.id (GUID) is stored with dashes, so the feed's join found
+# no author. create_all doesn't touch existing tables: the startup tasks bring
+# the old values to the GUID format (a no-op once done, and on Postgres, where
+# both are the native uuid type).
+SQLITE_POSTS_USER_ID_UPGRADE = (
+    "UPDATE posts SET user_id = lower("
+    "substr(user_id, 1, 8) || '-' || substr(user_id, 9, 4) || '-' || substr(user_id, 13, 4) || '-' || "
+    "substr(user_id, 17, 4) || '-' || substr(user_id, 21, 12)"
+    ") WHERE length(user_id) = 32"
+)
+
+
+def upgrade_posts_user_id(conn) -> None:
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(SQLITE_POSTS_USER_ID_UPGRADE))
+
+
+# Background work (see app/jobs.py). Jobs live in the database so they are
+# enqueued in the same transaction as the post and survive restarts, and so a
+# separate worker process (worker.py) can pick them up.
+class Job(Base):
+    __tablename__ = "jobs"
     
-# TODO: Investigate this
-engine = create_async_engine(DATABASE_URL)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    # pending -> running -> done, or back to pending with a later run_after, or failed
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # When the running attempt was claimed. A job still running JOB_LEASE_SECONDS
+    # later lost its process (killed, OOM) and is claimed again
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+Index("ix_jobs_status_run_after", Job.status, Job.run_after)
+
+
+def upgrade_jobs_claimed_at(conn) -> None:
+    """Add jobs.claimed_at to a database created before it existed (create_all only adds tables)"""
+    if "claimed_at" not in {column["name"] for column in inspect(conn).get_columns("jobs")}:
+        conn.execute(text("ALTER TABLE jobs ADD COLUMN claimed_at TIMESTAMP"))
+
+
+# Caption search (app/search.py). The index isn't part of the model because it
+# is a different thing per database, create_db_and_tables sets it up.
+#
+# SQLite: an FTS5 table over posts.caption kept in sync by triggers. Its rows
+# point at posts by id (post_id), not by the posts' implicit rowid, which
+# VACUUM may renumber. posts_search_keys gives every post a stable integer key
+# (an INTEGER PRIMARY KEY is never renumbered) used as the FTS rowid, so the
+# triggers find a post's row without scanning the index.
+SQLITE_SEARCH_KEY = "(SELECT id FROM posts_search_keys WHERE post_id = {}.id)"
+SQLITE_SEARCH_DDL = (
+    "CREATE TABLE posts_search_keys (id INTEGER PRIMARY KEY, post_id CHAR(32) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE posts_fts USING fts5("
+    "caption, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO posts_search_keys(post_id) VALUES (new.id); "
+    "INSERT INTO posts_fts(rowid, caption, post_id) "
+    f"VALUES ({SQLITE_SEARCH_KEY.format('new')}, new.caption, new.id); END",
+    "CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN "
+    f"DELETE FROM posts_fts WHERE rowid = {SQLITE_SEARCH_KEY.format('old')}; "
+    "DELETE FROM posts_search_keys WHERE post_id = old.id; END",
+    "CREATE TRIGGER posts_fts_update AFTER UPDATE OF caption ON posts BEGIN "
+    f"UPDATE posts_fts SET caption = new.caption WHERE rowid = {SQLITE_SEARCH_KEY.format('new')}; END",
+    # Index the posts that were there before
+    "INSERT INTO posts_search_keys(post_id) SELECT id FROM posts",
+    "INSERT INTO posts_fts(rowid, caption, post_id) "
+    "SELECT k.id, p.caption, p.id FROM posts p JOIN posts_search_keys k ON k.post_id = p.id"
+)
+# The first version of the index was keyed on posts.rowid, it is replaced
+SQLITE_SEARCH_DROP = (
+    "DROP TRIGGER IF EXISTS posts_fts_insert",
+    "DROP TRIGGER IF EXISTS posts_fts_delete",
+    "DROP TRIGGER IF EXISTS posts_fts_update",
+    "DROP TABLE IF EXISTS posts_fts"
+)
+
+# Postgres: a generated tsvector column (Postgres keeps it up to date) with a GIN index
+POSTGRES_SEARCH_CONFIG = "english"
+POSTGRES_SEARCH_DDL = (
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS "
+    f"(to_tsvector('{POSTGRES_SEARCH_CONFIG}', coalesce(caption, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)"
+)
+
+
+def create_search_index(conn) -> None:
+    if conn.dialect.name == "sqlite":
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'posts_search_keys'")).first()
+        statements = () if exists else SQLITE_SEARCH_DROP + SQLITE_SEARCH_DDL
+    elif conn.dialect.name == "postgresql":
+        statements = POSTGRES_SEARCH_DDL
+    else:
+        statements = ()
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def normalize_database_url(url: str) -> str:
+    """Hosting providers hand out postgres:// URLs, the async engine needs the asyncpg driver"""
+    parsed = make_url(url)
+    if parsed.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+def create_engine_from_settings(url: str) -> AsyncEngine:
+    """
+    Build the async engine for the configured database.
+    
+    SQLite (local runs): WAL mode so readers don't block the writer, plus a busy
+    timeout so concurrent writers wait instead of failing with "database is locked".
+    
+    Postgres (asyncpg): a sized, pre-pinged, recycled connection pool and a
+    server side statement_timeout so one slow query can't hold a connection forever.
+    """
+    url = normalize_database_url(url)
+    
+    if url.startswith("sqlite"):
+        engine = create_async_engine(url, connect_args={"timeout": settings.sqlite_busy_timeout_ms / 1000})
+        
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Safe with WAL and far fewer fsyncs than FULL
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            # Negative means KiB: 64MB of page cache per connection
+            cursor.execute("PRAGMA cache_size=-65536")
+            cursor.close()
+        
+        return engine
+    
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg") and settings.db_statement_timeout_ms:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+    
+    return create_async_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=connect_args
+    )
+
+
+engine = create_engine_from_settings(DATABASE_URL)
+instrument_engine(engine)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+# Read only queries that can live with a little replication lag go through
+# replicas.read(), see app/replicas.py
+replica_engines = [create_engine_from_settings(url) for url in settings.database_replica_urls]
+for replica_engine in replica_engines:
+    instrument_engine(replica_engine)
+replicas = ReplicaRouter(
+    async_session_maker,
+    replica_engines,
+    eject_seconds=settings.replica_eject_seconds,
+    read_after_write=settings.replica_read_after_write
+)
+
+
 # TODO: Investigate this
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_posts_user_id)
+        await conn.run_sync(upgrade_jobs_claimed_at)
+        await conn.run_sync(create_search_index)
 
 # TODO: Investigate this
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -50,5 +240,54 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
         
 
+# Columns kept in the cache for a user, enough to rebuild the row without the DB.
+# Not the password hash: it has no business in a shared cache, and only the
+# password reset checks it (use_cache=False there).
+USER_CACHE_FIELDS = ("id", "email", "is_active", "is_superuser", "is_verified")
+
+
+class CachedUserDatabase(SQLAlchemyUserDatabase):
+    """
+    fastapi-users loads the user row on every authenticated request, this
+    serves those lookups from the cache and drops the entry whenever the
+    user is written.
+    
+    A user served from the cache has no hashed_password loaded, set use_cache
+    to False before anything that needs it.
+    """
+    
+    use_cache = True
+    
+    async def get(self, id: uuid.UUID):
+        if not self.use_cache:
+            return await super().get(id)
+        
+        cached = await cache.get(user_key(id))
+        if cached is not None:
+            user = User(**{**cached, "id": uuid.UUID(cached["id"])})
+            # Mark it as an existing row and attach it to this session without a SELECT
+            make_transient_to_detached(user)
+            return await self.session.merge(user, load=False)
+        
+        user = await super().get(id)
+        if user is not None:
+            fields = {field: getattr(user, field) for field in USER_CACHE_FIELDS}
+            fields["id"] = str(fields["id"])
+            await cache.set(user_key(id), fields, ttl=settings.user_cache_ttl)
+        return user
+    
+    async def update(self, user: User, update_dict: dict):
+        user = await super().update(user, update_dict)
+        await cache.delete(user_key(user.id))
+        # The feed shows the author's email
+        await invalidate_feed()
+        return user
+    
+    async def delete(self, user: User):
+        await super().delete(user)
+        await cache.delete(user_key(user.id))
+        await invalidate_feed()
+
+
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase(session, User)
+    yield CachedUserDatabase(session, User)
@@ -0,0 +1,64 @@
+import hashlib
+from typing import Optional
+
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Post, User
+from app.pagination import decode_cursor, next_cursor
+from app.responses import dumps
+
+# Only the columns the feed shows: rows come back as plain tuples, no ORM objects to build
+FEED_COLUMNS = (
+    Post.id,
+    Post.user_id,
+    Post.caption,
+    Post.url,
+    Post.file_type,
+    Post.file_name,
+    Post.status,
+    Post.thumbnail_url,
+    Post.created_at,
+    func.coalesce(User.email, "Unknown").label("email")
+)
+
+
+async def load_feed_page(session: AsyncSession, cursor: Optional[str], limit: int) -> dict:
+    """Read one page of the feed from the database, in the shape it is cached in"""
+    # Newest posts first, the id breaks ties between posts with the same created_at.
+    # Joining only User.email means we never load users that are not on this page.
+    query = (
+        select(*FEED_COLUMNS)
+        .outerjoin(User, Post.user_id == User.id)
+        .order_by(Post.created_at.desc(), Post.id)
+        .limit(limit + 1)
+    )
+    
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Post.created_at < cursor_created_at,
+                and_(Post.created_at == cursor_created_at, Post.id > cursor_id)
+            )
+        )
+    
+    result = await session.execute(query)
+    rows = result.all()
+    cursor_for_next_page = next_cursor(rows, limit)
+    
+    # UUIDs and datetimes stay as they are, the JSON encoder formats them
+    posts_data = [row._asdict() for row in rows[:limit]]
+    
+    page = {"posts": posts_data, "next_cursor": cursor_for_next_page}
+    page["version"] = page_version(page)
+    return page
+
+
+def page_version(page: dict) -> str:
+    """
+    Digest of everything a page shows. It is computed once when the page is
+    loaded and cached along with it, so the feed's ETag costs nothing per request.
+    """
+    content = {"posts": page["posts"], "next_cursor": page["next_cursor"]}
+    return hashlib.sha256(dumps(content)).hexdigest()
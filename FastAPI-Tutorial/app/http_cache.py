@@ -0,0 +1,33 @@
+import hashlib
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """
+    Weak ETag from whatever identifies a representation (str / bytes / anything
+    with a str()). Weak because CompressionMiddleware sends the same content
+    as identity, gzip or br bytes under this one tag, and a strong ETag
+    promises byte-identical bodies.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"|")
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Does If-None-Match name this ETag? (weak comparison, as GET calls for)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return opaque in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def not_modified(etag: str, headers: dict) -> Response:
+    """304 with no body: the client's copy is current"""
+    return Response(status_code=304, headers={"ETag": etag, **headers})
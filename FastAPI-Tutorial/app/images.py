@@ -1,11 +1,15 @@
-from dotenv import load_dotenv
-from imagekitio import ImageKit
-import os
+from functools import lru_cache
 
-load_dotenv()
+from app.config import settings
 
-imagekit = ImageKit(
-    private_key=os.getenv("IMAGEKIT_PRIVATE_KEY"),
-    public_key=os.getenv("IMAGEKIT_PUBLIC_KEY"),
-    url_endpoint=os.getenv("IMAGEKIT_URL")
-)
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_imagekit():
+    """The ImageKit client, built (and the SDK imported) on first use"""
+    from imagekitio import ImageKit
+
+    return ImageKit(
+        private_key=settings.imagekit_private_key,
+        public_key=settings.imagekit_public_key,
+        url_endpoint=settings.imagekit_url
+    )
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import invalidate_feed
+from app.config import settings
+from app.db import Job, Post, async_session_maker
+from app.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+# kind -> coroutine that does the work, filled in by @job below
+handlers: dict[str, JobHandler] = {}
+
+
+def job(kind: str):
+    """Register a coroutine as the handler for one kind of job"""
+    def register(func: JobHandler) -> JobHandler:
+        handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(session: AsyncSession, kind: str, **payload) -> Job:
+    """
+    Add a job to the session. It is committed together with whatever the
+    request is writing, so a post never exists without its processing job.
+    Call job_queue.notify() after the commit to wake the in-process workers.
+    """
+    new_job = Job(kind=kind, payload=payload)
+    session.add(new_job)
+    return new_job
+
+
+# Jobs
+
+@job("process_upload")
+async def process_upload(session: AsyncSession, payload: dict):
+    """Sniff the real content type, build a thumbnail and mark the post ready"""
+    post = await session.get(Post, uuid.UUID(payload["post_id"]))
+    if post is None or not post.file_id:
+        return
+
+    details = await get_storage().details(post.file_id)
+    if details.content_type:
+        post.file_type = "video" if details.content_type.startswith("video/") else "image"
+    post.thumbnail_url = details.thumbnail_url
+    post.status = "ready"
+    await session.commit()
+    await invalidate_feed()
+
+
+@job("delete_file")
+async def delete_file(session: AsyncSession, payload: dict):
+    """Remove a deleted post's file from the storage backend"""
+    await get_storage().delete(payload["file_id"])
+
+
+class JobQueue:
+    """
+    Runs jobs from the jobs table with a pool of asyncio workers.
+
+    Any number of processes can run a JobQueue against the same database, a
+    job is claimed with a conditional UPDATE so only one of them runs it.
+    Failed jobs go back to pending with an exponential backoff until
+    JOB_MAX_ATTEMPTS is reached, then they stay as failed with the error.
+
+    A claim is a lease of lease_seconds: a stopped queue hands its jobs back,
+    but a killed process can't, so a job still running when its lease is up
+    is claimed again, its lost run counting as a failed attempt.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        retry_backoff: float,
+        poll_interval: float,
+        lease_seconds: float
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def notify(self):
+        """Tell idle workers there is new work instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def start(self):
+        self._stopping = False
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"job-worker-{n}"))
+        if self._tasks:
+            logger.info(f"Started {len(self._tasks)} job workers")
+
+    async def join(self):
+        """Wait on the workers, they only return when stopped"""
+        await asyncio.gather(*self._tasks)
+
+    async def stop(self, timeout: float = 0):
+        """
+        Stop claiming jobs and give the ones already running up to timeout
+        seconds to finish. Whatever is still running after that is cancelled
+        and goes back to pending for the next process to pick up.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if timeout and self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                ran = await self.run_next()
+            except Exception:
+                logger.exception("Job worker failed to fetch a job")
+                ran = False
+
+            if not ran and not self._stopping:
+                # Nothing to do: sleep until notified or until the next poll,
+                # polling is what picks up retries and jobs from other processes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self) -> Optional[Job]:
+        now = datetime.utcnow()
+        lost = and_(Job.status == "running", Job.claimed_at < now - timedelta(seconds=self.lease_seconds))
+        claimable = or_(and_(Job.status == "pending", Job.run_after <= now), lost)
+        async with async_session_maker() as session:
+            candidates = await session.execute(
+                select(Job.id, Job.kind, Job.status, Job.attempts)
+                .where(claimable)
+                .order_by(Job.run_after)
+                .limit(self.workers or 1)
+            )
+            for job_id, kind, status, attempts in candidates.all():
+                if status == "running":
+                    logger.warning(f"Job {job_id} ({kind}) outlived its lease, its process is gone")
+                    if attempts >= self.max_attempts:
+                        await session.execute(
+                            update(Job)
+                            .where(Job.id == job_id, lost)
+                            .values(status="failed", last_error="Lease expired: the process running it was lost")
+                        )
+                        await session.commit()
+                        continue
+                claimed = await session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, claimable)
+                    .values(status="running", attempts=Job.attempts + 1, claimed_at=now)
+                )
+                await session.commit()
+                if claimed.rowcount == 1:
+                    return await session.get(Job, job_id)
+        return None
+
+    async def _release(self, job_id: int):
+        async with async_session_maker() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "running")
+                .values(status="pending", attempts=Job.attempts - 1)
+            )
+            await session.commit()
+
+    async def run_next(self) -> bool:
+        """Claim and run one due job, returns False when there was none"""
+        claimed = await self._claim()
+        if claimed is None:
+            return False
+
+        handler = handlers.get(claimed.kind)
+        error = None
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {claimed.kind!r}")
+            async with async_session_maker() as session:
+                await handler(session, claimed.payload)
+        except asyncio.CancelledError:
+            # Stopped mid-job: hand it back instead of leaving it stuck as running
+            await asyncio.shield(self._release(claimed.id))
+            raise
+        except Exception:
+            error = traceback.format_exc()
+
+        async with async_session_maker() as session:
+            if error is None:
+                values = {"status": "done", "last_error": None}
+            elif claimed.attempts < self.max_attempts:
+                delay = self.retry_backoff * 2 ** (claimed.attempts - 1)
+                values = {
+                    "status": "pending",
+                    "run_after": datetime.utcnow() + timedelta(seconds=delay),
+                    "last_error": error
+                }
+                logger.warning(f"Job {claimed.id} ({claimed.kind}) failed, retrying in {delay:.0f}s")
+            else:
+                values = {"status": "failed", "last_error": error}
+                logger.error(f"Job {claimed.id} ({claimed.kind}) failed for good:\n{error}")
+            await session.execute(update(Job).where(Job.id == claimed.id).values(**values))
+            await session.commit()
+        return True
+
+
+job_queue = JobQueue(
+    workers=settings.job_workers,
+    max_attempts=settings.job_max_attempts,
+    retry_backoff=settings.job_retry_backoff,
+    poll_interval=settings.job_poll_interval,
+    lease_seconds=settings.job_lease_seconds
+)
+
+
+async def run_worker(workers: int):
+    """Entry point for a standalone worker process, see worker.py"""
+    queue = JobQueue(
+        workers=workers,
+        max_attempts=settings.job_max_attempts,
+        retry_backoff=settings.job_retry_backoff,
+        poll_interval=settings.job_poll_interval,
+        lease_seconds=settings.job_lease_seconds
+    )
+    await queue.start()
+    try:
+        await queue.join()
+    finally:
+        await queue.stop()
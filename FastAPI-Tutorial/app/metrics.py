@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import suppress
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class Metric:
+    """Base for the metric types: a name, a help line and one value per label set"""
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # Updated from the event loop and from worker threads alike
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key: tuple, *extra: str) -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)]
+        pairs += extra
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self, *extra: str) -> list[str]:
+        """Sample lines, extra (e.g. 'worker="12"') is added to every label set"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, *extra: str) -> list[str]:
+        with self._lock:
+            return [f"{self.name}{self._format_labels(key, *extra)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float], labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [count per bucket..., sum, total count]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[index] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    def samples(self, *extra: str) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, values in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    le = self._format_labels(key, *extra, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = self._format_labels(key, *extra, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {values[-1]}")
+                lines.append(f"{self.name}_sum{self._format_labels(key, *extra)} {values[-2]}")
+                lines.append(f"{self.name}_count{self._format_labels(key, *extra)} {values[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of one process. The server runs several worker processes and
+    a scrape reaches whichever one accepts the connection, so every series is
+    labelled worker="<pid>". With a directory to share (METRICS_DIR, serve.py
+    creates one) each worker also leaves its samples there every few seconds
+    and /metrics answers for all the workers at once.
+    """
+
+    def __init__(self, worker: Optional[str] = None):
+        self.metrics: list[Metric] = []
+        self._worker = worker
+        self.directory: Optional[str] = None
+        self.interval = 5.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def worker(self) -> str:
+        # Read on use: a registry imported before a fork belongs to the child
+        return self._worker or str(os.getpid())
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def samples(self) -> dict[str, list[str]]:
+        """This worker's sample lines by metric name"""
+        worker = f'worker="{self.worker}"'
+        return {metric.name: metric.samples(worker) for metric in self.metrics}
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        workers = [self.samples()]
+        if self.directory:
+            self._write(workers[0])
+            workers += self._read_others()
+        lines = []
+        for metric in self.metrics:
+            # The format wants all samples of a metric under a single header
+            lines += metric.header()
+            for samples in workers:
+                lines += samples.get(metric.name, [])
+        return "\n".join(lines) + "\n"
+
+    def _path(self, worker: str) -> str:
+        return os.path.join(self.directory, f"{worker}.json")
+
+    def _write(self, samples: dict[str, list[str]]):
+        path = self._path(self.worker)
+        # Written aside and renamed, so a reader never sees half a file
+        with open(path + ".tmp", "w") as f:
+            json.dump(samples, f)
+        os.replace(path + ".tmp", path)
+
+    def _read_others(self) -> list[dict[str, list[str]]]:
+        others = []
+        # A worker that stopped writing is gone, its series go with it
+        stale = time.time() - 3 * self.interval
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name == f"{self.worker}.json":
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < stale:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    others.append(json.load(f))
+            except (OSError, ValueError):
+                # Removed or replaced while we read it
+                continue
+        return others
+
+    def start_sharing(self, directory: str, interval: float):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = interval
+        self._task = asyncio.create_task(self._share())
+
+    async def _share(self):
+        while True:
+            self._write(self.samples())
+            await asyncio.sleep(self.interval)
+
+    async def stop_sharing(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            with suppress(FileNotFoundError):
+                os.remove(self._path(self.worker))
+
+
+registry = Registry()
+
+
+# Seconds, from 1ms to 10s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Bytes, from 100B to 10MB
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# HTTP
+http_requests = registry.register(Counter(
+    "http_requests_total",
+    "Requests handled, by route template and status code",
+    labels=("method", "route", "status")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled"
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving the request to sending the last byte of the response",
+    LATENCY_BUCKETS,
+    labels=("method", "route")
+))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes",
+    "Size of response bodies",
+    SIZE_BUCKETS,
+    labels=("method", "route")
+))
+
+# Database
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements, by statement type",
+    LATENCY_BUCKETS,
+    labels=("operation",)
+))
+db_query_failures = registry.register(Counter(
+    "db_query_failures_total",
+    "SQL statements that raised an error",
+    labels=("operation",)
+))
+
+
+class MetricsMiddleware:
+    """
+    Records count, latency, response size and in-flight requests per route.
+    Plain ASGI rather than BaseHTTPMiddleware, which would wrap every response
+    in an extra task and stream on the hot path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # The router leaves the matched route in the scope. Labelling with
+            # its template (/post/{post_id}) instead of the raw path keeps the
+            # number of series bounded.
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status_code)
+            http_request_duration.observe(time.perf_counter() - start, method=method, route=route)
+            http_response_size.observe(size, method=method, route=route)
+
+
+def _operation(statement: str) -> str:
+    """SELECT / INSERT / UPDATE / ... from the statement text"""
+    words = statement.split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement the engine runs"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_duration.observe(elapsed, operation=_operation(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+        db_query_failures.inc(operation=_operation(context.statement or ""))
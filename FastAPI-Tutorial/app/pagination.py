@@ -0,0 +1,56 @@
+import base64
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+
+# Default and maximum number of posts returned per feed page
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+# Search results are ordered by rank, not by a column a cursor could point
+# into, so they are paged by offset. Offsets get slower the deeper they go,
+# results stop after this many.
+SEARCH_MAX_RESULTS = 1000
+
+
+def encode_cursor(created_at: datetime, post_id: uuid.UUID) -> str:
+    """Build an opaque cursor pointing at the last post of a page"""
+    raw = f"{created_at.isoformat()}|{post_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Turn a cursor back into the (created_at, id) pair it was built from"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, post_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(post_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """
+    The feed query asks for one extra row, if it came back there is another
+    page and the cursor points at the last row we are actually returning.
+    """
+    if len(rows) <= limit:
+        return None
+    last_row = rows[limit - 1]
+    return encode_cursor(last_row.created_at, last_row.id)
+
+
+def encode_offset_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not 0 <= offset < SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
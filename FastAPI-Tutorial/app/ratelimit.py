@@ -0,0 +1,181 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Depends, HTTPException, Request
+
+from app.config import settings
+from app.db import User
+from app.users import current_active_user
+
+
+class MemoryRateLimiter:
+    """
+    Token buckets and concurrency slots kept in this process. Like the memory
+    cache, every worker counts on its own, so the effective limits are per
+    worker. Use the redis backend to enforce them across workers and replicas.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> (tokens, last refill)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._slots: dict[str, int] = {}
+
+    async def hit(self, key: str, rate: float, burst: int, cost: int = 1) -> float:
+        """
+        Take cost tokens from the bucket, returns 0 or the seconds until they
+        are available. A cost above burst needs a full bucket and leaves it in
+        debt, later requests wait until the rest is paid back.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        needed = min(cost, burst)
+        wait = 0.0
+        if tokens >= needed:
+            tokens -= cost
+        else:
+            wait = (needed - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # A bucket that dropped out is simply full again next time
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        if self._slots.get(key, 0) >= limit:
+            return False
+        self._slots[key] = self._slots.get(key, 0) + 1
+        return True
+
+    async def release_slot(self, key: str) -> None:
+        count = self._slots.get(key, 0) - 1
+        if count > 0:
+            self._slots[key] = count
+        else:
+            self._slots.pop(key, None)
+
+
+# Refill and take in one round trip, atomically, on Redis' clock
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local needed = math.min(cost, burst)
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= needed then
+    tokens = tokens - cost
+else
+    wait = (needed - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - math.min(tokens, 0)) / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """Same interface as MemoryRateLimiter, shared through Redis"""
+
+    # A slot whose release never came (worker killed mid-upload) frees itself after this
+    SLOT_TTL = 3600
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package: poetry add redis")
+        self.client = redis.from_url(url)
+        self._token_bucket = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str, rate: float, burst: int, cost: int = 1) -> float:
+        return float(await self._token_bucket(keys=[key], args=[rate, burst, cost]))
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        count = await self.client.incr(key)
+        await self.client.expire(key, self.SLOT_TTL)
+        if count > limit:
+            await self.client.decr(key)
+            return False
+        return True
+
+    async def release_slot(self, key: str) -> None:
+        await self.client.decr(key)
+
+
+def create_rate_limiter():
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimiter(settings.cache_url)
+    if settings.rate_limit_backend == "memory":
+        return MemoryRateLimiter(settings.cache_max_entries)
+    raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND: {settings.rate_limit_backend}")
+
+
+limiter = create_rate_limiter()
+
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def rate_limit(
+    name: str,
+    rate: float,
+    burst: int,
+    cost: Optional[Callable[[Request], Awaitable[int]]] = None
+):
+    """
+    Dependency limiting an endpoint to `rate` requests per second (with bursts
+    of up to `burst`) per user, and IP_RATE_LIMIT_FACTOR times that per client
+    IP when the factor is set. A rate of 0 turns the limit off. With `cost` a
+    request takes that many tokens instead of one (a batch of n uploads is n
+    uploads).
+
+    The client IP is request.client, which uvicorn only takes from
+    X-Forwarded-For for connections from FORWARDED_ALLOW_IPS (serve.py).
+    """
+    ip_rate = rate * settings.ip_rate_limit_factor
+    ip_burst = max(1, int(burst * settings.ip_rate_limit_factor))
+
+    async def check(request: Request, user: User = Depends(current_active_user)):
+        if rate <= 0:
+            return
+        tokens = await cost(request) if cost else 1
+        wait = await limiter.hit(f"ratelimit:{name}:user:{user.id}", rate, burst, tokens)
+        if wait == 0 and request.client and ip_rate > 0:
+            wait = await limiter.hit(f"ratelimit:{name}:ip:{request.client.host}", ip_rate, ip_burst, tokens)
+        if wait > 0:
+            raise too_many_requests("Too many requests, slow down", wait)
+
+    return check
+
+
+async def user_upload_slot(user: User = Depends(current_active_user)):
+    """
+    Dependency holding one of the user's MAX_UPLOADS_PER_USER upload slots for
+    the duration of the request, so one user can't take every upload slot
+    (MAX_CONCURRENT_UPLOADS) of a worker. 0 turns it off.
+    """
+    if settings.max_uploads_per_user <= 0:
+        yield
+        return
+    key = f"uploads:user:{user.id}"
+    if not await limiter.acquire_slot(key, settings.max_uploads_per_user):
+        raise too_many_requests("Too many uploads in progress for this user", settings.upload_slot_timeout)
+    try:
+        yield
+    finally:
+        await limiter.release_slot(key)
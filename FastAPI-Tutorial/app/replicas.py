@@ -0,0 +1,123 @@
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.cache import FEED_CHANGED_KEY, cache
+from app.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# The replica is unreachable or broken (as opposed to a bad query): take it out of rotation
+REPLICA_ERRORS = (OperationalError, InterfaceError, OSError)
+
+replica_reads = registry.register(Counter(
+    "db_replica_reads_total",
+    "Reads routed by the replica router, by target (primary or replica index)",
+    labels=("target",)
+))
+replica_ejections = registry.register(Counter(
+    "db_replica_ejections_total",
+    "Times a read replica was taken out of rotation after failing",
+    labels=("replica",)
+))
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        # Out of rotation until this time.monotonic()
+        self.ejected_until = 0.0
+
+
+class ReplicaRouter:
+    """
+    Routes read only queries to the read replicas, round-robin, while writes
+    keep using the primary (async_session_maker / get_async_session).
+
+    A replica whose connection fails is ejected for `eject_seconds` and the
+    read is retried on the primary, so the request doesn't fail. After that the
+    replica gets traffic again, and is ejected again if it still fails. With
+    no replica configured or available reads go to the primary.
+
+    Replicas lag behind the primary. Endpoints that write call wrote(user.id)
+    after committing, and for `read_after_write` seconds that user's reads go
+    to the primary (read(..., primary=True)), otherwise a feed reloaded right
+    after an upload could miss it. The mark is kept in the cache, so with the
+    redis backend it follows the user across workers.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        engines: list[AsyncEngine],
+        eject_seconds: float,
+        read_after_write: float
+    ):
+        self.primary = primary
+        self.replicas = [Replica(str(index), engine) for index, engine in enumerate(engines)]
+        self.eject_seconds = eject_seconds
+        self.read_after_write = read_after_write
+        self._next = itertools.cycle(self.replicas)
+
+    async def wrote(self, user_id) -> None:
+        """Send user_id's reads to the primary for the next read_after_write seconds"""
+        if self.replicas and self.read_after_write > 0:
+            await cache.set(f"read_after_write:{user_id}", True, ttl=self.read_after_write)
+
+    async def recently_wrote(self, user_id) -> bool:
+        if not self.replicas or self.read_after_write <= 0:
+            return False
+        return await cache.get(f"read_after_write:{user_id}") is not None
+
+    async def feed_recently_changed(self) -> bool:
+        """
+        True for read_after_write seconds after the feed changed (for anyone).
+        A feed page is cached for every user, so a replica that hasn't caught
+        up yet would serve the old feed to all of them for FEED_CACHE_TTL.
+        """
+        if not self.replicas or self.read_after_write <= 0:
+            return False
+        return await cache.get(FEED_CHANGED_KEY) is not None
+
+    def pick(self) -> Optional[Replica]:
+        """Next replica in rotation, None when none is available"""
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            replica = next(self._next)
+            if replica.ejected_until <= now:
+                return replica
+        return None
+
+    def eject(self, replica: Replica, error: Exception) -> None:
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+        replica_ejections.inc(replica=replica.name)
+        logger.warning(f"Read replica {replica.name} ejected for {self.eject_seconds:.0f}s: {error}")
+
+    async def read(self, query: Callable[[AsyncSession], Awaitable[T]], primary: bool = False) -> T:
+        """Run query(session) on a replica, or on the primary when asked to or none can take it"""
+        replica = None if primary else self.pick()
+        if replica is not None:
+            try:
+                async with replica.session_maker() as session:
+                    result = await query(session)
+                replica_reads.inc(target=replica.name)
+                return result
+            except REPLICA_ERRORS as e:
+                self.eject(replica, e)
+
+        async with self.primary() as session:
+            result = await query(session)
+        replica_reads.inc(target="primary")
+        return result
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
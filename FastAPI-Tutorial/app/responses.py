@@ -0,0 +1,41 @@
+import json
+import logging
+from datetime import date
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# orjson is a dependency: it serializes UUIDs and datetimes natively and is
+# several times faster than the standard library. An install that skipped it
+# still works on json, but says so, since every response is then slower.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning("orjson is not installed, JSON responses fall back to the slower json module")
+
+
+def _default(value: Any) -> str:
+    # Same output as orjson: ISO 8601 dates, UUIDs as their canonical string
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when available. Returning it from a
+    route skips FastAPI's jsonable_encoder / response_model validation, the
+    route's response_model is then only used for the docs.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from fastapi_users import schemas
+from datetime import datetime
+from typing import Optional
 import uuid
 
 class PostCreate(BaseModel):
@@ -7,8 +9,28 @@ class PostCreate(BaseModel):
     content: str
 
 class PostResponse(BaseModel):
-    title: str
-    content: str
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: uuid.UUID
+    user_id: uuid.UUID
+    caption: Optional[str]
+    url: str
+    file_type: str
+    file_name: str
+    status: str
+    thumbnail_url: Optional[str]
+    created_at: datetime
+
+class FeedPost(PostResponse):
+    email: str
+    is_owner: bool
+
+class FeedResponse(BaseModel):
+    posts: list[FeedPost]
+    next_cursor: Optional[str]
+    
+class BatchDeleteRequest(BaseModel):
+    post_ids: list[str]
     
 class UserRead(schemas.BaseUser[uuid.UUID]):
     pass
@@ -0,0 +1,70 @@
+import re
+from typing import Optional
+
+from sqlalchemy import and_, column, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import Post, User, POSTGRES_SEARCH_CONFIG
+from app.feed import FEED_COLUMNS
+from app.pagination import SEARCH_MAX_RESULTS, decode_offset_cursor, encode_offset_cursor
+
+# The FTS5 table and the tsvector column are created by create_db_and_tables (app/db.py)
+posts_fts = table("posts_fts", column("post_id"))
+search_vector = literal_column("posts.search_vector")
+
+
+def search_terms(q: str) -> list[str]:
+    """Words of the query, anything else (quotes, operators, punctuation) is dropped"""
+    return re.findall(r"\w+", q)[:20]
+
+
+def search_query(dialect: str, terms: list[str]):
+    """Matching posts (every term must be there), best match first"""
+    query = select(*FEED_COLUMNS).outerjoin(User, Post.user_id == User.id)
+
+    if dialect == "postgresql":
+        # websearch_to_tsquery parses user input without ever raising a syntax error
+        tsquery = func.websearch_to_tsquery(
+            literal_column(f"'{POSTGRES_SEARCH_CONFIG}'::regconfig"), " ".join(terms)
+        )
+        return (
+            query
+            .where(search_vector.op("@@")(tsquery))
+            .order_by(func.ts_rank_cd(search_vector, tsquery).desc(), Post.created_at.desc(), Post.id)
+        )
+
+    if dialect == "sqlite":
+        # Each term quoted, so FTS5 reads them as plain words, not as query syntax
+        match = " ".join(f'"{term}"' for term in terms)
+        return (
+            query
+            .join(posts_fts, posts_fts.c.post_id == Post.id)
+            .where(literal_column("posts_fts").op("MATCH")(match))
+            # bm25() is lower for better matches
+            .order_by(func.bm25(literal_column("posts_fts")), Post.created_at.desc(), Post.id)
+        )
+
+    # No text index: a scan, good enough for a database we don't deploy on
+    return (
+        query
+        .where(and_(*(Post.caption.ilike(f"%{term}%") for term in terms)))
+        .order_by(Post.created_at.desc(), Post.id)
+    )
+
+
+async def search_posts(session: AsyncSession, q: str, cursor: Optional[str], limit: int) -> dict:
+    """One page of the posts whose caption matches q, in the shape of a feed page"""
+    terms = search_terms(q)
+    if not terms:
+        return {"posts": [], "next_cursor": None}
+
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    limit = min(limit, SEARCH_MAX_RESULTS - offset)
+    query = search_query(session.bind.dialect.name, terms).offset(offset).limit(limit + 1)
+
+    rows = (await session.execute(query)).all()
+    more = len(rows) > limit and offset + limit < SEARCH_MAX_RESULTS
+    return {
+        "posts": [row._asdict() for row in rows[:limit]],
+        "next_cursor": encode_offset_cursor(offset + limit) if more else None
+    }
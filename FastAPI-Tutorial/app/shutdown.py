@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Optional
+
+from app.config import settings
+from app.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+requests_drained = registry.register(Counter(
+    "http_requests_drained_total",
+    "Requests that finished after shutdown began"
+))
+requests_aborted = registry.register(Counter(
+    "http_requests_aborted_total",
+    "Requests cancelled because they were still running at the drain deadline"
+))
+
+
+class Drain:
+    """
+    Graceful shutdown on SIGTERM.
+
+    1. Readiness fails at once, so the load balancer stops routing here, but
+       requests are still served for DRAIN_DELAY seconds while it catches up.
+    2. The signal is handed to the server, which stops accepting connections
+       and waits for the open requests.
+    3. Requests still running DRAIN_TIMEOUT seconds later are cancelled.
+
+    The lifespan shutdown then has until the same deadline to stop background
+    work before the database engine is closed.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.deadline: Optional[float] = None
+        self._requests: set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def install(self):
+        """Take SIGTERM over from the server, called from lifespan"""
+        self._loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def forward(sig, frame):
+            if callable(previous):
+                previous(sig, frame)
+            else:
+                signal.signal(sig, previous)
+                os.kill(os.getpid(), sig)
+
+        def handle(sig, frame):
+            self._loop.call_soon_threadsafe(self.begin, lambda: forward(sig, frame))
+
+        try:
+            signal.signal(signal.SIGTERM, handle)
+        except ValueError:
+            # Not on the main thread (e.g. a test client), leave signals alone
+            pass
+
+    def begin(self, stop_server):
+        if self.draining:
+            # Second SIGTERM: stop waiting
+            stop_server()
+            return
+        self.draining = True
+        self.deadline = self._loop.time() + settings.drain_delay + settings.drain_timeout
+        logger.info(f"Draining: {len(self._requests)} requests in flight")
+        self._loop.call_later(settings.drain_delay, self._stop_accepting, stop_server)
+
+    def _stop_accepting(self, stop_server):
+        stop_server()
+        self._loop.call_at(self.deadline, self._abort)
+
+    def _abort(self):
+        if self._requests:
+            logger.warning(f"Drain deadline reached, aborting {len(self._requests)} requests")
+        for task in list(self._requests):
+            task.cancel()
+
+    def remaining(self) -> float:
+        """Seconds left until the drain deadline"""
+        if self.deadline is None:
+            return settings.drain_timeout
+        return max(self.deadline - asyncio.get_running_loop().time(), 0)
+
+
+drain = Drain()
+
+
+class DrainMiddleware:
+    """Tracks in-flight requests for Drain and counts how they ended"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and drain.draining:
+                # Keep-alive clients reconnect, and land on a replica that isn't going away
+                message = {**message, "headers": [*message.get("headers", []), (b"connection", b"close")]}
+            await send(message)
+
+        # The server runs every request in its own task
+        task = asyncio.current_task()
+        drain._requests.add(task)
+        aborted = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except asyncio.CancelledError:
+            aborted = True
+            raise
+        finally:
+            drain._requests.discard(task)
+            if drain.draining:
+                (requests_aborted if aborted else requests_drained).inc()
@@ -0,0 +1,53 @@
+import os
+from typing import Optional
+
+from app.metrics import Gauge, registry
+
+startup_seconds = registry.register(Gauge(
+    "app_startup_seconds",
+    "Cold start time of this worker, by phase",
+    labels=("phase",)
+))
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started (from /proc, so Linux only), None elsewhere"""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name (field 2) may contain spaces, the fields after it don't
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0)
+
+
+class StartupTimer:
+    """
+    Splits the time from process start to ready into phases. Each mark()
+    closes the phase that ended there. For import time per module see
+    bench/startup.py.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self._last = 0.0
+
+    def mark(self, phase: str):
+        now = process_age()
+        if now is None:
+            return
+        self.phases[phase] = now - self._last
+        self._last = now
+        startup_seconds.set(self.phases[phase], phase=phase)
+
+    def report(self):
+        if not self.phases:
+            return
+        startup_seconds.set(self._last, phase="total")
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+        print(f"Ready in {self._last:.2f}s ({phases})")
+
+
+startup_timer = StartupTimer()
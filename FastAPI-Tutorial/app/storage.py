@@ -0,0 +1,423 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+
+from app.config import settings
+from app.uploads import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# What create_multipart_upload hands out (uuid4().hex)
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+THUMBNAIL_SIZE = (320, 320)
+
+# Leading bytes of the formats we accept, used to tell the real type of a file
+# instead of trusting the Content-Type the client sent
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+]
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Guess a MIME type from the first bytes of a file"""
+    for magic, mime in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    # MP4 / MOV: an "ftyp" box right after the 4 byte box size
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    return None
+
+
+@dataclass
+class StoredFile:
+    """What a backend hands back after an upload"""
+    file_id: str
+    name: str
+    url: str
+
+
+@dataclass
+class FileDetails:
+    """What the post-upload job needs to know about a stored file"""
+    content_type: Optional[str]
+    thumbnail_url: Optional[str]
+
+
+class UploadIncomplete(Exception):
+    """
+    A resumable upload stopped part way. The first `received` bytes are
+    stored, sending the rest with the same upload_id and offset=received
+    finishes it.
+    """
+
+    def __init__(self, upload_id: str, received: int, reason: str):
+        super().__init__(reason)
+        self.upload_id = upload_id
+        self.received = received
+
+
+class UploadOffsetMismatch(UploadIncomplete):
+    """The offset sent doesn't match what the server has for that upload_id"""
+
+
+class UploadNotFound(LookupError):
+    """The upload_id belongs to another user: it can't be resumed by this one"""
+
+
+class StorageBackend:
+    """
+    Where uploaded media lives. /upload and /post/{post_id} only talk to this
+    interface, so the backend can be swapped with STORAGE_BACKEND.
+    """
+
+    # Whether upload() takes an upload_id and offset to resume an interrupted
+    # upload, and the owner (user id) who alone may resume it
+    resumable = False
+
+    async def upload(
+        self,
+        file: UploadFile,
+        file_name: str,
+        content_type: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        offset: int = 0,
+        owner: Optional[str] = None
+    ) -> StoredFile:
+        raise NotImplementedError
+
+    async def delete(self, file_id: str) -> None:
+        raise NotImplementedError
+
+    async def content_type(self, file_id: str) -> Optional[str]:
+        """The real MIME type of a stored file, None if it can't be told"""
+        return None
+
+    async def thumbnail(self, file_id: str) -> Optional[str]:
+        """URL of a thumbnail for a stored file, None if the backend can't make one"""
+        return None
+
+    async def details(self, file_id: str) -> FileDetails:
+        """Content type and thumbnail together, backends that get both from one call override this"""
+        return FileDetails(await self.content_type(file_id), await self.thumbnail(file_id))
+
+
+class ImageKitStorage(StorageBackend):
+    """Uploads to ImageKit.io through its (blocking) Python SDK"""
+
+    def __init__(self):
+        # Built here so running with another backend doesn't need ImageKit keys
+        from app.images import get_imagekit
+        self.client = get_imagekit()
+
+    async def upload(
+        self,
+        file: UploadFile,
+        file_name: str,
+        content_type: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        offset: int = 0,
+        owner: Optional[str] = None
+    ) -> StoredFile:
+        from imagekitio.models.UploadFileRequestOptions import UploadFileRequestOptions
+
+        # UploadFile is already spooled by Starlette, so we hand its file object
+        # straight to the SDK instead of copying it to another temp file first.
+        await file.seek(0)
+        result = await run_blocking(
+            self.client.upload_file,
+            file=file.file,
+            file_name=file_name,
+            options=UploadFileRequestOptions(
+                use_unique_file_name=True,
+                tags=["backend-upload"]
+            )
+        )
+        return StoredFile(file_id=result.file_id, name=result.name, url=result.url)
+
+    async def delete(self, file_id: str) -> None:
+        await run_blocking(self.client.delete_file, file_id=file_id)
+
+    # ImageKit already knows the MIME type and builds thumbnails on its side,
+    # both come back in the same file details record
+    async def content_type(self, file_id: str) -> Optional[str]:
+        return (await self.details(file_id)).content_type
+
+    async def thumbnail(self, file_id: str) -> Optional[str]:
+        return (await self.details(file_id)).thumbnail_url
+
+    async def details(self, file_id: str) -> FileDetails:
+        result = await run_blocking(self.client.get_file_details, file_id=file_id)
+        return FileDetails(content_type=result.mime, thumbnail_url=result.thumbnail)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Keeps files on local disk using the same flow as an S3 multipart upload:
+    create the upload, send numbered parts, then complete (or abort) it.
+
+    Parts are read from the request one at a time and written in parallel, at
+    most MULTIPART_CONCURRENCY at once, so memory stays around
+    concurrency * part size no matter how big the video is. A failed part is
+    retried on its own with backoff.
+
+    Uploads given an upload_id are resumable: if one fails its parts stay in
+    the staging directory (outside the served root) and UploadIncomplete
+    tells how many bytes are stored. Sending the rest of the file with the
+    same upload_id and that offset picks up after the last stored part. Only
+    the owner the upload was started for can resume it.
+
+    Unfinished uploads nobody resumed within resume_ttl are removed when the
+    storage is created and then at most every CLEAN_INTERVAL seconds, on the
+    next upload.
+    """
+
+    resumable = True
+
+    CLEAN_INTERVAL = 3600
+
+    def __init__(
+        self,
+        root: str,
+        staging: str,
+        base_url: str,
+        part_size: int,
+        concurrency: int,
+        max_retries: int,
+        resume_ttl: float
+    ):
+        self.root = Path(root)
+        self.staging = Path(staging)
+        self.base_url = base_url.rstrip("/")
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.resume_ttl = resume_ttl
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.staging.mkdir(parents=True, exist_ok=True)
+        self.clean_staging()
+        self._next_clean = time.monotonic() + self.CLEAN_INTERVAL
+
+    # S3-like primitives, these block on disk I/O and run in the upload thread pool
+
+    def create_multipart_upload(self) -> str:
+        upload_id = uuid.uuid4().hex
+        (self.staging / upload_id).mkdir(parents=True, exist_ok=True)
+        return upload_id
+
+    def claim_upload(self, upload_id: str, owner: str) -> None:
+        """Start upload_id for owner, or check it is theirs when it already exists"""
+        owner_path = self.staging / upload_id / "owner"
+        try:
+            (self.staging / upload_id).mkdir(parents=True)
+        except FileExistsError:
+            if not owner_path.exists() or owner_path.read_text() != owner:
+                raise UploadNotFound(upload_id)
+        else:
+            owner_path.write_text(owner)
+
+    def upload_part(self, upload_id: str, part_number: int, data: bytes) -> str:
+        part_path = self._part_path(upload_id, part_number)
+        etag = hashlib.md5(data).hexdigest()
+
+        # Resuming: a part that is already there with the same content is skipped
+        if part_path.exists() and hashlib.md5(part_path.read_bytes()).hexdigest() == etag:
+            return etag
+
+        # Write next to the final name and rename, so a crash never leaves half a part
+        tmp_path = part_path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(part_path)
+        return etag
+
+    def complete_multipart_upload(self, upload_id: str, key: str, part_count: int) -> None:
+        dest = self.root / key
+        tmp_dest = dest.with_name(dest.name + ".tmp")
+        with open(tmp_dest, "wb") as out:
+            for part_number in range(1, part_count + 1):
+                with open(self._part_path(upload_id, part_number), "rb") as part:
+                    shutil.copyfileobj(part, out)
+        tmp_dest.replace(dest)
+        self.abort_multipart_upload(upload_id)
+
+    def abort_multipart_upload(self, upload_id: str) -> None:
+        shutil.rmtree(self.staging / upload_id, ignore_errors=True)
+
+    def _part_path(self, upload_id: str, part_number: int) -> Path:
+        return self.staging / upload_id / f"part-{part_number:05d}"
+
+    def stored_parts(self, upload_id: str) -> tuple[int, int]:
+        """Parts stored without a gap from the first one, and their size in bytes"""
+        count = 0
+        size = 0
+        while True:
+            part_path = self._part_path(upload_id, count + 1)
+            if not part_path.exists():
+                return count, size
+            count += 1
+            size += part_path.stat().st_size
+
+    def clean_staging(self) -> None:
+        """Drop unfinished uploads nobody resumed within MULTIPART_RESUME_TTL"""
+        cutoff = time.time() - self.resume_ttl
+        for upload_dir in self.staging.iterdir():
+            if upload_dir.is_dir() and upload_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+
+    async def _clean_staging_if_due(self) -> None:
+        if time.monotonic() < self._next_clean:
+            return
+        self._next_clean = time.monotonic() + self.CLEAN_INTERVAL
+        await run_blocking(self.clean_staging)
+
+    # StorageBackend
+
+    async def upload(
+        self,
+        file: UploadFile,
+        file_name: str,
+        content_type: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        offset: int = 0,
+        owner: Optional[str] = None
+    ) -> StoredFile:
+        await self._clean_staging_if_due()
+        ext = os.path.splitext(file_name or "")[1]
+        key = f"{uuid.uuid4().hex}{ext}"
+        # Staged parts are only kept around on failure when the caller can resume them
+        resumable = upload_id is not None
+        part_number = 0
+        if upload_id is None:
+            upload_id = await run_blocking(self.create_multipart_upload)
+        else:
+            # It names a directory, only accept what create_multipart_upload hands out
+            if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+                raise ValueError("Invalid upload_id")
+            await run_blocking(self.claim_upload, upload_id, owner or "")
+            part_number, received = await run_blocking(self.stored_parts, upload_id)
+            if offset != received:
+                raise UploadOffsetMismatch(upload_id, received, f"Expected offset {received}, got {offset}")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+
+        try:
+            while True:
+                # Don't read the next part until one of the in-flight ones is done
+                await slots.acquire()
+                chunk = await file.read(self.part_size)
+                if not chunk:
+                    slots.release()
+                    break
+                part_number += 1
+                tasks.append(asyncio.create_task(
+                    self._send_part(slots, upload_id, part_number, chunk)
+                ))
+
+            await asyncio.gather(*tasks)
+            await run_blocking(self.complete_multipart_upload, upload_id, key, part_number)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if not resumable:
+                await run_blocking(self.abort_multipart_upload, upload_id)
+                raise
+            if not isinstance(e, Exception):
+                raise
+            _, received = await run_blocking(self.stored_parts, upload_id)
+            raise UploadIncomplete(upload_id, received, str(e)) from e
+
+        return StoredFile(file_id=key, name=file_name, url=f"{self.base_url}/{key}")
+
+    async def _send_part(self, slots: asyncio.Semaphore, upload_id: str, part_number: int, data: bytes) -> str:
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    return await run_blocking(self.upload_part, upload_id, part_number, data)
+                except OSError as e:
+                    if attempt == self.max_retries:
+                        raise
+                    logger.warning(f"Part {part_number} of upload {upload_id} failed ({e}), retrying")
+                    await asyncio.sleep(0.1 * 2 ** (attempt - 1))
+        finally:
+            slots.release()
+
+    async def delete(self, file_id: str) -> None:
+        path = self.root / file_id
+        await run_blocking(path.unlink, missing_ok=True)
+        await run_blocking((self.root / "thumbnails" / f"{file_id}.jpg").unlink, missing_ok=True)
+
+    async def content_type(self, file_id: str) -> Optional[str]:
+        return await run_blocking(self._sniff, file_id)
+
+    def _sniff(self, file_id: str) -> Optional[str]:
+        with open(self.root / file_id, "rb") as f:
+            return sniff_content_type(f.read(32))
+
+    async def thumbnail(self, file_id: str) -> Optional[str]:
+        return await run_blocking(self._make_thumbnail, file_id)
+
+    def _make_thumbnail(self, file_id: str) -> Optional[str]:
+        # Pillow is optional, without it (or for videos) there is simply no thumbnail
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+
+        thumbnails = self.root / "thumbnails"
+        thumbnails.mkdir(exist_ok=True)
+        try:
+            with Image.open(self.root / file_id) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.convert("RGB").save(thumbnails / f"{file_id}.jpg", "JPEG")
+        except OSError:
+            return None
+        return f"{self.base_url}/thumbnails/{file_id}.jpg"
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """FastAPI dependency returning the configured storage backend"""
+    global _storage
+    if _storage is None:
+        if settings.storage_backend == "local":
+            _storage = LocalStorage(
+                root=settings.local_storage_dir,
+                staging=settings.local_staging_dir,
+                base_url=settings.local_storage_url,
+                part_size=settings.multipart_part_size,
+                concurrency=settings.multipart_concurrency,
+                max_retries=settings.multipart_max_retries,
+                resume_ttl=settings.multipart_resume_ttl
+            )
+        elif settings.storage_backend == "imagekit":
+            _storage = ImageKitStorage()
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.storage_backend}")
+    return _storage
+
+
+def set_storage(backend: StorageBackend) -> None:
+    """Replace the storage backend for the whole process (benchmarks, local experiments)"""
+    global _storage
+    _storage = backend
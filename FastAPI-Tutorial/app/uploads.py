@@ -0,0 +1,45 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+# Blocking SDK calls run here instead of on the event loop, the pool is bounded
+# so a burst of uploads can't spawn an unbounded number of threads
+upload_executor = ThreadPoolExecutor(
+    max_workers=settings.upload_worker_threads,
+    thread_name_prefix="upload"
+)
+
+# Caps how many uploads are in flight on this worker at once
+_upload_slots = asyncio.Semaphore(settings.max_concurrent_uploads)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call in the upload thread pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(upload_executor, functools.partial(func, *args, **kwargs))
+
+
+@asynccontextmanager
+async def upload_slot():
+    """
+    Hold one of the MAX_CONCURRENT_UPLOADS slots for the duration of an upload.
+    If none frees up within UPLOAD_SLOT_TIMEOUT seconds the client gets a 503
+    instead of piling up behind a large transfer.
+    """
+    try:
+        await asyncio.wait_for(_upload_slots.acquire(), timeout=settings.upload_slot_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many uploads in progress, try again later",
+            headers={"Retry-After": str(int(settings.upload_slot_timeout))}
+        )
+    try:
+        yield
+    finally:
+        _upload_slots.release()
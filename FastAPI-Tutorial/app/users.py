@@ -1,25 +1,33 @@
+import hashlib
+import time
 import uuid
 from typing import Optional
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models, exceptions
 from fastapi_users.authentication import (
     AuthenticationBackend,
     BearerTransport,
     JWTStrategy
 )
-import os
-from dotenv import load_dotenv
+from fastapi_users.jwt import decode_jwt, generate_jwt
+import jwt
 
 from fastapi_users.db import SQLAlchemyUserDatabase
+from app.cache import token_cache
+from app.config import settings
 from app.db import User, get_user_db
 
-load_dotenv()
-SECRET = str(os.getenv("SECRET"))
+SECRET = settings.secret
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
     
+    async def reset_password(self, token: str, password: str, request: Optional[Request] = None) -> User:
+        # The token is checked against the password hash, which cached users don't carry
+        self.user_db.use_cache = False
+        return await super().reset_password(token, password, request)
+    
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered")
 
@@ -36,8 +44,79 @@ async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db
 
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
+# Identity fields written into every token, so a recent token is enough to know who is calling
+CLAIM_FIELDS = ("email", "is_active", "is_verified", "is_superuser")
+
+
+class ClaimsJWTStrategy(JWTStrategy):
+    """
+    JWTStrategy that embeds the user's identity claims in the token and
+    caches decoded tokens by their hash, so the signature is only verified
+    once per token instead of once per request.
+    
+    With trust_claims=True a token issued less than AUTH_CLAIMS_MAX_AGE
+    seconds ago is turned into a User straight from its claims, without
+    reading the user row. That User is not attached to any session, so only
+    use it on routes that read the user (see current_active_user below).
+    Older tokens stay valid until they expire but cost a user lookup per
+    request, clients keep theirs recent with POST /auth/jwt/refresh.
+    """
+    
+    def __init__(self, *args, trust_claims: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trust_claims = trust_claims
+    
+    async def write_token(self, user: User) -> str:
+        data = {"sub": str(user.id), "aud": self.token_audience, "iat": int(time.time())}
+        for field in CLAIM_FIELDS:
+            data[field] = getattr(user, field)
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm)
+    
+    async def decode(self, token: str) -> Optional[dict]:
+        key = "token:" + hashlib.sha256(token.encode()).hexdigest()
+        claims = await token_cache.get(key)
+        if claims is None:
+            try:
+                claims = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+            except jwt.PyJWTError:
+                return None
+            ttl = settings.token_cache_ttl
+            if "exp" in claims:
+                ttl = min(ttl, claims["exp"] - time.time())
+            await token_cache.set(key, claims, ttl=ttl)
+        # A cached token still has to be rejected once it expires
+        elif "exp" in claims and claims["exp"] < time.time():
+            return None
+        return claims
+    
+    async def read_token(self, token: Optional[str], user_manager: BaseUserManager) -> Optional[User]:
+        if token is None:
+            return None
+        
+        claims = await self.decode(token)
+        if claims is None or claims.get("sub") is None:
+            return None
+        
+        try:
+            user_id = user_manager.parse_id(claims["sub"])
+        except exceptions.InvalidID:
+            return None
+        
+        fresh = time.time() - claims.get("iat", 0) <= settings.auth_claims_max_age
+        if self.trust_claims and fresh and all(field in claims for field in CLAIM_FIELDS):
+            return User(id=user_id, **{field: claims[field] for field in CLAIM_FIELDS})
+        
+        try:
+            return await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+
+
 def get_jwt_strategy():
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return ClaimsJWTStrategy(secret=SECRET, lifetime_seconds=3600)
+
+def get_claims_jwt_strategy():
+    return ClaimsJWTStrategy(secret=SECRET, lifetime_seconds=3600, trust_claims=settings.auth_stateless)
 
 auth_backend = AuthenticationBackend(
     name="jwt",
@@ -45,5 +124,24 @@ auth_backend = AuthenticationBackend(
     get_strategy=get_jwt_strategy
 )
 
-fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
-current_active_user = fastapi_users.current_user(active=True)
\ No newline at end of file
+# Same bearer tokens, but allowed to trust the claims (AUTH_STATELESS=true)
+claims_auth_backend = AuthenticationBackend(
+    name="jwt-claims",
+    transport=bearer_transport,
+    get_strategy=get_claims_jwt_strategy
+)
+
+fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend, claims_auth_backend])
+
+# /auth/jwt/refresh: always loads the user row, so a deactivated user can't get new claims
+current_active_user_from_db = fastapi_users.current_user(
+    active=True,
+    get_enabled_backends=lambda: [auth_backend]
+)
+
+# Used by /feed, /upload and /post/{id}, which only read the user's id.
+# The /users routes keep loading the row since they may write to it.
+current_active_user = fastapi_users.current_user(
+    active=True,
+    get_enabled_backends=lambda: [claims_auth_backend]
+)
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Shared setup for the benchmarks: environment defaults and a storage stand-in"""
+import os
+import uuid
+from typing import Optional
+
+# Set before anything imports app.config
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+os.environ.setdefault("SECRET", "bench-secret-not-for-production-use")
+# Every simulated client comes from the same IP, the limits would measure themselves
+for limit in ("FEED_RATE_LIMIT", "UPLOAD_RATE_LIMIT", "MAX_UPLOADS_PER_USER"):
+    os.environ.setdefault(limit, "0")
+
+from fastapi import UploadFile
+
+from app.storage import StorageBackend, StoredFile
+
+BENCH_PASSWORD = "bench-password"
+
+
+def bench_email(n: int) -> str:
+    return f"bench-{n}@example.com"
+
+
+class FakeStorage(StorageBackend):
+    """
+    Stands in for ImageKit: reads the whole upload (so the request body is
+    still consumed like a real transfer) and keeps nothing.
+    """
+
+    def __init__(self, chunk_size: int = 1024 * 1024):
+        self.chunk_size = chunk_size
+
+    async def upload(self, file: UploadFile, file_name: str, content_type: Optional[str] = None) -> StoredFile:
+        while await file.read(self.chunk_size):
+            pass
+        file_id = uuid.uuid4().hex
+        return StoredFile(file_id=file_id, name=file_name, url=f"https://fake.local/{file_id}/{file_name}")
+
+    async def delete(self, file_id: str) -> None:
+        pass
+
+    async def content_type(self, file_id: str) -> Optional[str]:
+        return "image/png"
@@ -0,0 +1,226 @@
+"""
+Load test for the API, run in-process through httpx's ASGI transport.
+
+    python -m bench.seed --users 100 --posts 10000
+    python -m bench.load --processes 4 --concurrency 16 --duration 10
+    python -m bench.load --json results.json
+    python -m bench.load --compare results.json --max-regression 0.2
+
+Each of the --processes workers builds its own copy of the app (its own
+engine, cache and job queue, like a uvicorn worker) and runs --concurrency
+clients per scenario for --duration seconds. Storage is replaced by
+bench.common.FakeStorage, so no ImageKit account is needed.
+
+Reports per endpoint: requests/s, error count, p50/p95/p99 latency and how
+much the workers' peak RSS grew while it ran. With --compare the run fails
+(exit code 1) when an endpoint's p95 or throughput is worse than the
+baseline by more than --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+# Scenarios run in this order: delete uses the posts created by upload
+SCENARIOS = ["login", "feed", "feed_pages", "upload", "delete"]
+
+UPLOAD_BODY = b"\x89PNG\r\n\x1a\n" + bytes(64 * 1024)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_worker(worker: int, users: int, concurrency: int, duration: float) -> dict:
+    # Imported here so every spawned process builds its own app from the environment
+    import httpx
+    from bench.common import BENCH_PASSWORD, FakeStorage, bench_email
+    from app.app import app
+    from app.storage import set_storage
+
+    set_storage(FakeStorage())
+    results = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def login(n: int) -> httpx.Response:
+                return await client.post(
+                    "/auth/jwt/login",
+                    data={"username": bench_email(n % users), "password": BENCH_PASSWORD}
+                )
+
+            # One token per client, each client acts as a different bench user
+            tokens = []
+            for n in range(concurrency):
+                response = await login(worker * concurrency + n)
+                response.raise_for_status()
+                tokens.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+
+            uploaded = [[] for _ in range(concurrency)]
+
+            async def feed(n: int) -> httpx.Response:
+                return await client.get("/feed", params={"limit": 20}, headers=tokens[n])
+
+            async def feed_pages(n: int) -> httpx.Response:
+                # Walk a few pages deep with the cursor, like a client scrolling
+                cursor = None
+                for _ in range(5):
+                    params = {"limit": 20, **({"cursor": cursor} if cursor else {})}
+                    response = await client.get("/feed", params=params, headers=tokens[n])
+                    cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+                    if not cursor:
+                        break
+                return response
+
+            async def upload(n: int) -> httpx.Response:
+                response = await client.post(
+                    "/upload",
+                    files={"file": ("bench.png", UPLOAD_BODY, "image/png")},
+                    data={"caption": "bench upload"},
+                    headers=tokens[n]
+                )
+                if response.status_code == 200:
+                    uploaded[n].append(response.json()["id"])
+                return response
+
+            async def delete(n: int) -> httpx.Response | None:
+                if not uploaded[n]:
+                    return None
+                return await client.delete(f"/post/{uploaded[n].pop()}", headers=tokens[n])
+
+            requests = {"login": login, "feed": feed, "feed_pages": feed_pages, "upload": upload, "delete": delete}
+
+            for scenario in SCENARIOS:
+                send = requests[scenario]
+                latencies = []
+                errors = 0
+                rss_before = peak_rss_mb()
+                deadline = time.perf_counter() + duration
+
+                async def client_loop(n: int):
+                    nonlocal errors
+                    while time.perf_counter() < deadline:
+                        started = time.perf_counter()
+                        response = await send(n)
+                        if response is None:
+                            return
+                        latencies.append(time.perf_counter() - started)
+                        if response.status_code >= 400:
+                            errors += 1
+
+                started = time.perf_counter()
+                await asyncio.gather(*(client_loop(n) for n in range(concurrency)))
+                results[scenario] = {
+                    "latencies": latencies,
+                    "errors": errors,
+                    "elapsed": time.perf_counter() - started,
+                    "rss_growth_mb": peak_rss_mb() - rss_before
+                }
+
+    return results
+
+
+def worker_main(worker: int, users: int, concurrency: int, duration: float, queue):
+    queue.put(asyncio.run(run_worker(worker, users, concurrency, duration)))
+
+
+def summarize(worker_results: list[dict]) -> dict:
+    summary = {}
+    for scenario in SCENARIOS:
+        runs = [result[scenario] for result in worker_results if scenario in result]
+        latencies = [latency for run in runs for latency in run["latencies"]]
+        elapsed = max((run["elapsed"] for run in runs), default=0) or 1
+        summary[scenario] = {
+            "requests": len(latencies),
+            "errors": sum(run["errors"] for run in runs),
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "rss_growth_mb": max((run["rss_growth_mb"] for run in runs), default=0)
+        }
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"{'endpoint':12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss +MB':>8}")
+    for scenario, row in summary.items():
+        print(
+            f"{scenario:12} {row['requests']:9d} {row['errors']:7d} {row['rps']:9.1f} "
+            f"{row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['p99_ms']:8.2f} {row['rss_growth_mb']:8.1f}"
+        )
+
+
+def compare(summary: dict, baseline: dict, max_regression: float) -> list[str]:
+    regressions = []
+    for scenario, row in summary.items():
+        base = baseline.get(scenario)
+        if not base or not base["requests"]:
+            continue
+        if row["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{scenario}: p95 {base['p95_ms']:.2f}ms -> {row['p95_ms']:.2f}ms")
+        if row["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(f"{scenario}: throughput {base['rps']:.1f} -> {row['rps']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API in-process")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients per process")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per endpoint")
+    parser.add_argument("--users", type=int, default=100, help="Seeded users to log in as")
+    parser.add_argument("--json", help="Write the summary to this file")
+    parser.add_argument("--compare", help="Baseline summary (from --json) to check against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # spawn, not fork: every worker starts clean, like separate uvicorn workers
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [
+        context.Process(target=worker_main, args=(n, args.users, args.concurrency, args.duration, queue))
+        for n in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    worker_results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = summarize(worker_results)
+    print(f"{args.processes} processes x {args.concurrency} clients, {args.duration}s per endpoint")
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(summary, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Seed the database with benchmark users and posts.
+
+    python -m bench.seed --users 100 --posts 100000
+
+Uses DATABASE_URL (default: sqlite+aiosqlite:///./bench.db). Every user is
+bench-<n>@example.com with the password from bench/common.py. Existing
+bench users and their posts are removed first, so seeding is repeatable.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bench.common import BENCH_PASSWORD, bench_email
+
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import delete, insert, select
+
+from app.db import Post, User, async_session_maker, create_db_and_tables, engine
+
+BATCH_SIZE = 5000
+
+
+async def seed(users: int, posts: int):
+    await create_db_and_tables()
+
+    # Hashing is deliberately slow, every bench user shares one hash
+    hashed_password = PasswordHelper().hash(BENCH_PASSWORD)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    start = datetime.utcnow() - timedelta(days=365)
+
+    async with async_session_maker() as session:
+        bench_users = select(User.id).where(User.email.like("bench-%@example.com"))
+        await session.execute(delete(Post).where(Post.user_id.in_(bench_users)))
+        await session.execute(delete(User).where(User.id.in_(bench_users)))
+        await session.execute(insert(User), [
+            {
+                "id": user_id,
+                "email": bench_email(n),
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "is_superuser": False,
+                "is_verified": True
+            }
+            for n, user_id in enumerate(user_ids)
+        ])
+
+        # Plain INSERT ... VALUES batches, much faster than adding ORM objects one by one
+        for offset in range(0, posts, BATCH_SIZE):
+            await session.execute(insert(Post), [
+                {
+                    "id": uuid.uuid4(),
+                    "user_id": random.choice(user_ids),
+                    "caption": f"bench post {n}",
+                    "url": f"https://fake.local/{n}.jpg",
+                    "file_type": "image",
+                    "file_name": f"{n}.jpg",
+                    "file_id": f"bench-{n}",
+                    "status": "ready",
+                    "created_at": start + timedelta(seconds=n)
+                }
+                for n in range(offset, min(offset + BATCH_SIZE, posts))
+            ])
+        await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed benchmark users and posts")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=10000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    asyncio.run(seed(args.users, args.posts))
+    print(f"Seeded {args.users} users and {args.posts} posts in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,102 @@
+"""
+Serialization cost of a feed page, before and after the column-only select + orjson change.
+
+    python -m bench.serialization --posts 1000 --rounds 20
+
+Seeds an in-memory SQLite database and times, per 1k posts:
+- before: select(Post, User.email) hydrating ORM objects, dicts built with str() / isoformat(),
+  then FastAPI's jsonable_encoder + json.dumps
+- after: select of the feed columns only (plain rows), row._asdict(), rendered by app.responses.dumps
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+
+from app.db import Base, Post, User, engine, async_session_maker
+from app.feed import FEED_COLUMNS
+from app.responses import dumps, orjson
+
+
+async def seed(posts: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session_maker() as session:
+        user = User(id=uuid.uuid4(), email="bench@example.com", hashed_password="x")
+        session.add(user)
+        start = datetime(2025, 1, 1)
+        for n in range(posts):
+            session.add(Post(
+                user_id=user.id,
+                caption=f"caption {n}",
+                url=f"https://example.com/{n}.jpg",
+                file_type="image",
+                file_name=f"{n}.jpg",
+                status="ready",
+                created_at=start + timedelta(seconds=n)
+            ))
+        await session.commit()
+    return user.id
+
+
+async def before(user_id) -> tuple[float, float]:
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        result = await session.execute(select(Post, User.email).outerjoin(User, Post.user_id == User.id))
+        posts_data = [
+            {
+                "id": str(post.id),
+                "user_id": str(post.user_id),
+                "caption": post.caption,
+                "url": post.url,
+                "file_type": post.file_type,
+                "file_name": post.file_name,
+                "created_at": post.created_at.isoformat(),
+                "is_owner": post.user_id == user_id,
+                "email": email or "Unknown"
+            }
+            for post, email in result.all()
+        ]
+    loaded = time.perf_counter()
+    json.dumps(jsonable_encoder({"posts": posts_data})).encode()
+    return loaded - started, time.perf_counter() - loaded
+
+
+async def after(user_id) -> tuple[float, float]:
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        result = await session.execute(select(*FEED_COLUMNS).outerjoin(User, Post.user_id == User.id))
+        posts_data = [{**row._asdict(), "is_owner": row.user_id == user_id} for row in result.all()]
+    loaded = time.perf_counter()
+    dumps({"posts": posts_data})
+    return loaded - started, time.perf_counter() - loaded
+
+
+async def main(posts: int, rounds: int):
+    user_id = await seed(posts)
+    scale = 1000 / posts * 1000  # seconds per `posts` -> milliseconds per 1k posts
+    print(f"{posts} posts, {rounds} rounds, encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(f"{'':8} {'query+build ms/1k':>18} {'serialize ms/1k':>16} {'total ms/1k':>12}")
+    for name, run in (("before", before), ("after", after)):
+        await run(user_id)  # warm up
+        timings = [await run(user_id) for _ in range(rounds)]
+        load = min(t[0] for t in timings) * scale
+        serialize = min(t[1] for t in timings) * scale
+        print(f"{name:8} {load:18.2f} {serialize:16.2f} {load + serialize:12.2f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.posts, args.rounds))
@@ -0,0 +1,100 @@
+"""
+Cold start report: import time per module and time until the server is ready.
+
+    python -m bench.startup
+    python -m bench.startup --top 30 --runs 5
+
+Imports are timed in a fresh interpreter with python -X importtime. Our own
+modules are listed one by one and third party ones grouped by package, by
+self time (what the module itself costs, not what it imports). Time to ready
+starts serve.py with one worker and polls /readyz until it answers.
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+def bench_env(**extra) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+    env.setdefault("SECRET", "bench-secret-not-for-production-use")
+    env.update(extra)
+    return env
+
+
+def import_times() -> tuple[Counter, float]:
+    """Self time (ms) per module group, and the cumulative time of importing the app"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.app"],
+        env=bench_env(),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    groups = Counter()
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        group = name if name.startswith("app.") else name.split(".")[0]
+        groups[group] += int(self_us) / 1000
+        if name == "app.app":
+            total = int(cumulative_us) / 1000
+    return groups, total
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_ready(timeout: float = 30) -> float:
+    """Seconds from launching serve.py until /readyz answers 200"""
+    port = free_port()
+    env = bench_env(PORT=str(port), HOST="127.0.0.1", WEB_CONCURRENCY="1", DRAIN_DELAY="0")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "serve.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f"Server not ready after {timeout}s")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=20, help="Module groups to list")
+    parser.add_argument("--runs", type=int, default=3, help="Server starts to take the median of")
+    args = parser.parse_args()
+
+    groups, total = import_times()
+    print(f"import app.app: {total:.0f} ms\n")
+    print(f"{'module':<40} {'self ms':>8}")
+    for name, ms in groups.most_common(args.top):
+        print(f"{name:<40} {ms:>8.1f}")
+
+    readies = [time_to_ready() for _ in range(args.runs)]
+    print(f"\nTime to ready: median {statistics.median(readies):.2f}s over {args.runs} runs "
+          f"(min {min(readies):.2f}s, max {max(readies):.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+from app.config import settings
+
+# Production server: python serve.py
+# (main.py is the single process, auto-reloading development server)
+
+
+def cpu_count() -> int:
+    """
+    CPUs this process may actually use. In a container os.cpu_count() is the
+    host's, the CPU limit only shows up as a cgroup quota.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run_startup_tasks():
+    """Work that must happen once per deployment, not once per worker"""
+    from app.db import create_db_and_tables, engine
+
+    async def prepare():
+        await create_db_and_tables()
+        # The workers open their own connections
+        await engine.dispose()
+
+    asyncio.run(prepare())
+
+
+if __name__ == "__main__":
+    if settings.run_startup_tasks:
+        run_startup_tasks()
+        # Read by the workers' settings when they start
+        os.environ["RUN_STARTUP_TASKS"] = "false"
+
+    workers = settings.web_concurrency or cpu_count()
+    shared_metrics = None
+    if workers > 1 and not settings.metrics_dir:
+        # Each worker has its own metrics, /metrics merges them from here
+        shared_metrics = tempfile.mkdtemp(prefix="metrics-")
+        os.environ["METRICS_DIR"] = shared_metrics
+
+    uvicorn.run(
+        "app.app:app",
+        host=settings.host,
+        port=settings.port,
+        workers=workers,
+        # uvloop and httptools when installed (uvicorn[standard]), asyncio and h11 otherwise
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=settings.keep_alive,
+        backlog=settings.backlog,
+        # The client address (request.client, per IP rate limits) comes from
+        # X-Forwarded-For, but only when the connection is from a trusted proxy
+        proxy_headers=True,
+        forwarded_allow_ips=settings.forwarded_allow_ips,
+        # A log line per request is real overhead at load, /metrics covers it
+        access_log=False
+    )
+
+    if shared_metrics:
+        shutil.rmtree(shared_metrics, ignore_errors=True)
@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+# Set before anything imports app.config: a throwaway database, local storage
+# and limits small enough to hit in a test
+_tmp = tempfile.mkdtemp(prefix="fastapi-tutorial-tests-")
+DATABASE_PATH = f"{_tmp}/test.db"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+os.environ["SECRET"] = "test-secret-not-for-production-use-0123456789"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = f"{_tmp}/media"
+os.environ["LOCAL_STAGING_DIR"] = f"{_tmp}/staging"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ["FEED_RATE_LIMIT"] = "1"
+os.environ["FEED_RATE_BURST"] = "3"
+os.environ["UPLOAD_RATE_LIMIT"] = "0"
+os.environ["MAX_UPLOADS_PER_USER"] = "0"
+os.environ["JOB_RETRY_BACKOFF"] = "2"
+
+import httpx
+import pytest
+
+from app.app import app
+from app.cache import cache, token_cache
+from app.db import create_db_and_tables, engine
+from app.ratelimit import limiter
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """A new database file and empty caches for every test"""
+    await engine.dispose()
+    if os.path.exists(DATABASE_PATH):
+        os.remove(DATABASE_PATH)
+    await create_db_and_tables()
+    cache._data.clear()
+    token_cache._data.clear()
+    limiter._buckets.clear()
+    limiter._slots.clear()
+    yield
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def register(client, email: str) -> tuple[str, dict]:
+    """Register a user, returns its id and the headers authenticating as it"""
+    response = await client.post("/auth/register", json={"email": email, "password": "password123"})
+    assert response.status_code == 201, response.text
+    user_id = response.json()["id"]
+    response = await client.post("/auth/jwt/login", data={"username": email, "password": "password123"})
+    return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+async def user(client) -> tuple[str, dict]:
+    """A registered user: its id and the headers authenticating as it"""
+    return await register(client, "user@example.com")
+
+
+@pytest.fixture
+async def other_user(client) -> tuple[str, dict]:
+    return await register(client, "other@example.com")
+
+
+@pytest.fixture
+def add_posts(db):
+    """Insert count ready posts for a user straight into the database, returns their ids"""
+    import uuid
+    from datetime import datetime, timedelta
+
+    from app.db import Post, async_session_maker
+
+    async def add(user_id: str, count: int, same_time: bool = False) -> list:
+        start = datetime(2025, 1, 1)
+        async with async_session_maker() as session:
+            posts = [
+                Post(
+                    user_id=uuid.UUID(user_id),
+                    caption=f"post {n}",
+                    url=f"http://test/media/{n}.jpg",
+                    file_type="image",
+                    file_name=f"{n}.jpg",
+                    # With same_time every post has the same created_at, only the id orders them
+                    created_at=start if same_time else start + timedelta(minutes=n)
+                )
+                for n in range(count)
+            ]
+            session.add_all(posts)
+            await session.commit()
+            return [post.id for post in posts]
+
+    return add
@@ -0,0 +1,88 @@
+import time
+import uuid
+
+import pytest
+from fastapi_users import exceptions
+from sqlalchemy import update
+
+from app import users
+from app.cache import cache, token_cache
+from app.db import User, async_session_maker
+from app.users import ClaimsJWTStrategy
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "test-secret-not-for-production-use-0123456789"
+
+
+class CountingUserManager:
+    """Just enough of a UserManager for read_token, counting the user lookups"""
+
+    def __init__(self, user: User):
+        self.user = user
+        self.lookups = 0
+
+    def parse_id(self, value):
+        return uuid.UUID(value)
+
+    async def get(self, user_id):
+        self.lookups += 1
+        if user_id != self.user.id:
+            raise exceptions.UserNotExists()
+        return self.user
+
+
+def a_user() -> User:
+    return User(id=uuid.uuid4(), email="claims@example.com", is_active=True, is_verified=False, is_superuser=False)
+
+
+async def test_recent_token_skips_the_user_lookup(monkeypatch):
+    user = a_user()
+    manager = CountingUserManager(user)
+    strategy = ClaimsJWTStrategy(secret=SECRET, lifetime_seconds=3600, trust_claims=True)
+    token = await strategy.write_token(user)
+
+    assert (await strategy.read_token(token, manager)).email == user.email
+    assert manager.lookups == 0
+
+    # Past AUTH_CLAIMS_MAX_AGE the token still works, through the user table
+    now = time.time()
+    monkeypatch.setattr(users.time, "time", lambda: now + users.settings.auth_claims_max_age + 1)
+    assert (await strategy.read_token(token, manager)).id == user.id
+    assert manager.lookups == 1
+
+
+async def test_decoded_tokens_have_their_own_cache(client, user):
+    _, headers = user
+    assert (await client.get("/feed", headers=headers)).status_code == 200
+    assert any(key.startswith("token:") for key in token_cache._data)
+    assert not any(key.startswith("token:") for key in cache._data)
+
+
+async def test_refresh_issues_a_newer_token(client, user, monkeypatch):
+    # A token issued two minutes ago, its claims no longer trusted
+    now = time.time()
+    monkeypatch.setattr(users.time, "time", lambda: now - 120)
+    login = await client.post("/auth/jwt/login", data={"username": "user@example.com", "password": "password123"})
+    old_token = login.json()["access_token"]
+    monkeypatch.undo()
+
+    response = await client.post("/auth/jwt/refresh", headers={"Authorization": f"Bearer {old_token}"})
+    assert response.status_code == 200, response.text
+    token = response.json()["access_token"]
+    strategy = ClaimsJWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    assert (await strategy.decode(token))["iat"] >= int(now)
+    assert (await strategy.decode(old_token))["iat"] < int(now) - 60
+    assert (await client.get("/feed", headers={"Authorization": f"Bearer {token}"})).status_code == 200
+
+
+async def test_deactivated_user_cannot_refresh(client, user):
+    user_id, headers = user
+    async with async_session_maker() as session:
+        await session.execute(update(User).where(User.id == uuid.UUID(user_id)).values(is_active=False))
+        await session.commit()
+    # Drop the cached user row, as an update through the API would
+    cache._data.clear()
+
+    response = await client.post("/auth/jwt/refresh", headers=headers)
+    assert response.status_code == 401
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import Job, Post, async_session_maker
+from app.storage import LocalStorage
+
+pytestmark = pytest.mark.anyio
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+def jpegs(*names: str) -> list:
+    return [("files", (name, JPEG, "image/jpeg")) for name in names]
+
+
+def stored_files() -> set[str]:
+    root = settings.local_storage_dir
+    return {name for name in os.listdir(root) if name != "thumbnails"} if os.path.isdir(root) else set()
+
+
+async def post_captions() -> list[str]:
+    async with async_session_maker() as session:
+        return sorted((await session.execute(select(Post.caption))).scalars())
+
+
+async def test_batch_upload_reports_each_file(client, user, monkeypatch):
+    _, headers = user
+    upload = LocalStorage.upload
+
+    async def failing_upload(self, file, file_name, *args, **kwargs):
+        if file_name == "bad.jpg":
+            raise OSError("disk full")
+        return await upload(self, file, file_name, *args, **kwargs)
+
+    monkeypatch.setattr(LocalStorage, "upload", failing_upload)
+
+    response = await client.post(
+        "/upload/batch",
+        files=jpegs("a.jpg", "bad.jpg", "c.jpg"),
+        data={"captions": ["first", "second", "third"]},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["uploaded"], body["failed"]) == (2, 1)
+    assert [result["success"] for result in body["results"]] == [True, False, True]
+    assert body["results"][1] == {"file_name": "bad.jpg", "success": False, "error": "disk full"}
+    # Captions stay with their files even though the middle one failed
+    assert await post_captions() == ["first", "third"]
+
+
+async def test_batch_upload_over_the_limit_is_a_413(client, user, monkeypatch):
+    _, headers = user
+    monkeypatch.setattr(settings, "max_batch_size", 2)
+    response = await client.post("/upload/batch", files=jpegs("a.jpg", "b.jpg", "c.jpg"), headers=headers)
+    assert response.status_code == 413
+    assert await post_captions() == []
+
+
+async def test_batch_upload_runs_at_most_max_uploads_per_user_transfers(client, user, monkeypatch):
+    _, headers = user
+    monkeypatch.setattr(settings, "max_uploads_per_user", 2)
+    upload = LocalStorage.upload
+    running = 0
+    most = 0
+
+    async def slow_upload(self, *args, **kwargs):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return await upload(self, *args, **kwargs)
+
+    monkeypatch.setattr(LocalStorage, "upload", slow_upload)
+
+    response = await client.post("/upload/batch", files=jpegs(*(f"{i}.jpg" for i in range(6))), headers=headers)
+    assert response.json()["uploaded"] == 6
+    # MAX_CONCURRENT_UPLOADS is 4, the batch stays within the user's share
+    assert most == 2
+
+
+async def test_batch_upload_removes_the_files_when_the_commit_fails(client, user, monkeypatch):
+    _, headers = user
+
+    async def failing_commit(self):
+        raise RuntimeError("database gone")
+
+    before = stored_files()
+    monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+    response = await client.post("/upload/batch", files=jpegs("a.jpg", "b.jpg"), headers=headers)
+    monkeypatch.undo()
+
+    assert response.status_code == 500
+    assert stored_files() == before
+    assert await post_captions() == []
+
+
+async def test_batch_delete_only_deletes_the_callers_posts(client, user, add_posts):
+    user_id, headers = user
+    response = await client.post("/auth/register", json={"email": "other@example.com", "password": "password123"})
+    other_id = response.json()["id"]
+    mine = await add_posts(user_id, 2)
+    theirs = await add_posts(other_id, 1)
+    async with async_session_maker() as session:
+        await session.execute(update(Post).where(Post.id == mine[0]).values(file_id="mine-0.jpg"))
+        await session.commit()
+
+    missing = str(uuid.uuid4())
+    ids = [str(mine[0]), str(theirs[0]), missing, "not-a-uuid", str(mine[1])]
+    response = await client.post("/post/batch-delete", json={"post_ids": ids}, headers=headers)
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["deleted"] == 2
+    assert body["results"] == {
+        str(mine[0]): {"success": True},
+        str(theirs[0]): {"success": False, "error": "You don't have permission to delete this post"},
+        missing: {"success": False, "error": "Post not found"},
+        "not-a-uuid": {"success": False, "error": "Invalid post id"},
+        str(mine[1]): {"success": True},
+    }
+    async with async_session_maker() as session:
+        assert list((await session.execute(select(Post.id))).scalars()) == [theirs[0]]
+        jobs = (await session.execute(select(Job.kind, Job.payload))).all()
+    # Only the post that had a stored file needs one removed
+    assert [(kind, payload) for kind, payload in jobs] == [("delete_file", {"file_id": "mine-0.jpg"})]
+
+
+async def test_batch_delete_over_the_limit_is_a_413(client, user, monkeypatch):
+    _, headers = user
+    monkeypatch.setattr(settings, "max_batch_size", 2)
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    response = await client.post("/post/batch-delete", json={"post_ids": ids}, headers=headers)
+    assert response.status_code == 413
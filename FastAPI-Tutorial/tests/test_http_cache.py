@@ -0,0 +1,116 @@
+from pathlib import Path
+
+import pytest
+from starlette.requests import Request
+
+from app.compression import is_compressible
+from app.config import settings
+from app.http_cache import etag_matches, make_etag
+
+
+def request_with(if_none_match: str) -> Request:
+    return Request({"type": "http", "headers": [(b"if-none-match", if_none_match.encode())]})
+
+
+def test_etag_depends_on_every_part():
+    assert make_etag("a", 1) == make_etag("a", 1)
+    assert make_etag("a", 1) != make_etag("a", 2)
+    assert make_etag("ab", "c") != make_etag("a", "bc")
+
+
+def test_etag_is_weak():
+    # The same tag covers the identity, gzip and br encodings of a response
+    assert make_etag("page").startswith('W/"')
+
+
+@pytest.mark.parametrize("header", ['"x", {etag}', "{opaque}", '"x", {opaque}', "*"])
+def test_etag_matches(header):
+    etag = make_etag("page")
+    opaque = etag.removeprefix("W/")
+    assert etag_matches(request_with(header.format(etag=etag, opaque=opaque)), etag)
+
+
+def test_etag_does_not_match_another_tag():
+    assert not etag_matches(request_with(make_etag("old page")), make_etag("page"))
+
+
+@pytest.mark.anyio
+async def test_feed_revalidates_with_304(client, user, add_posts):
+    user_id, headers = user
+    await add_posts(user_id, 3)
+
+    response = await client.get("/feed", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = await client.get("/feed", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+@pytest.mark.anyio
+async def test_etag_is_the_same_compressed_or_not(client, user, add_posts):
+    user_id, headers = user
+    # Big enough a page to be compressed
+    await add_posts(user_id, 20)
+
+    plain = await client.get("/feed", headers={**headers, "Accept-Encoding": "identity"})
+    gzipped = await client.get("/feed", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == plain.headers["etag"]
+
+    # A client that got one encoding revalidates while asking for another
+    response = await client.get(
+        "/feed", headers={**headers, "Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]}
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_feed_etag_changes_with_the_feed(client, user, add_posts):
+    user_id, headers = user
+    etag = (await client.get("/feed", headers=headers)).headers["etag"]
+
+    # add_posts skips the API, so drop the cached page the way an upload does
+    from app.cache import invalidate_feed
+    await add_posts(user_id, 1)
+    await invalidate_feed()
+
+    response = await client.get("/feed", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize(
+    "content_type, compressible",
+    [
+        ("application/json", True),
+        ("text/html; charset=utf-8", True),
+        ("image/svg+xml", True),
+        ("image/jpeg", False),
+        ("video/mp4", False),
+        ("application/zip", False),
+        ("font/woff2", False),
+    ],
+)
+def test_is_compressible(content_type, compressible):
+    assert is_compressible(content_type) is compressible
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+async def test_media_is_not_compressed(client, encoding):
+    # Repetitive bytes would shrink a lot, the content type alone decides
+    media_dir = Path(settings.local_storage_dir)
+    media_dir.mkdir(parents=True, exist_ok=True)
+    body = b"\xff\xd8" + b"\x00" * 8192
+    (media_dir / "photo.jpg").write_bytes(body)
+    (media_dir / "clip.mp4").write_bytes(body)
+
+    for name in ("photo.jpg", "clip.mp4"):
+        response = await client.get(f"{settings.local_storage_url}/{name}", headers={"Accept-Encoding": encoding})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.content == body
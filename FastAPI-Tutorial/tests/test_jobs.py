@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import inspect, select, text, update
+
+from app.db import Job, async_session_maker, create_db_and_tables, engine
+from app.jobs import JobQueue, enqueue, handlers, job
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(db):
+    return JobQueue(workers=1, max_attempts=2, retry_backoff=60, poll_interval=1, lease_seconds=600)
+
+
+@pytest.fixture
+def calls():
+    """Handlers for test job kinds, recording the payloads they ran with"""
+    calls = []
+
+    @job("test_ok")
+    async def ok(session, payload):
+        calls.append(payload)
+
+    @job("test_fail")
+    async def fail(session, payload):
+        calls.append(payload)
+        raise RuntimeError("boom")
+
+    yield calls
+    handlers.pop("test_ok")
+    handlers.pop("test_fail")
+
+
+async def add_job(kind: str, **payload) -> int:
+    async with async_session_maker() as session:
+        new_job = enqueue(session, kind, **payload)
+        await session.commit()
+        return new_job.id
+
+
+async def get_job(job_id: int) -> Job:
+    async with async_session_maker() as session:
+        return (await session.execute(select(Job).where(Job.id == job_id))).scalar_one()
+
+
+async def test_run_next_runs_a_job_once(queue, calls):
+    job_id = await add_job("test_ok", n=1)
+
+    assert await queue.run_next()
+    assert calls == [{"n": 1}]
+    finished = await get_job(job_id)
+    assert finished.status == "done"
+    assert finished.attempts == 1
+
+    assert not await queue.run_next()
+    assert calls == [{"n": 1}]
+
+
+async def test_claimed_job_is_not_claimed_again(queue, calls):
+    job_id = await add_job("test_ok")
+
+    claimed = await queue._claim()
+    assert claimed.id == job_id
+    assert (await get_job(job_id)).status == "running"
+    # Another worker (or process) polling now finds nothing to take
+    assert await JobQueue(workers=4, max_attempts=2, retry_backoff=60, poll_interval=1, lease_seconds=600)._claim() is None
+
+
+async def test_failed_job_is_retried_later_then_fails(queue, calls):
+    job_id = await add_job("test_fail")
+
+    assert await queue.run_next()
+    retrying = await get_job(job_id)
+    assert retrying.status == "pending"
+    assert retrying.attempts == 1
+    assert "boom" in retrying.last_error
+    # Backing off: not due yet
+    assert not await queue.run_next()
+
+    async with async_session_maker() as session:
+        job_row = await session.get(Job, job_id)
+        job_row.run_after = job_row.created_at
+        await session.commit()
+
+    assert await queue.run_next()
+    failed = await get_job(job_id)
+    assert failed.status == "failed"
+    assert failed.attempts == 2
+    assert len(calls) == 2
+
+
+async def lose_claim(job_id: int, minutes_ago: int) -> None:
+    """Leave the job as a killed process would: running, claimed a while back"""
+    async with async_session_maker() as session:
+        job_row = await session.get(Job, job_id)
+        job_row.claimed_at = job_row.created_at - timedelta(minutes=minutes_ago)
+        await session.commit()
+
+
+async def test_job_of_a_killed_process_is_claimed_again(queue, calls):
+    job_id = await add_job("test_ok")
+    await queue._claim()
+
+    # Still within its lease: somebody is running it
+    assert not await queue.run_next()
+
+    await lose_claim(job_id, minutes_ago=11)
+    assert await queue.run_next()
+    assert calls == [{}]
+    finished = await get_job(job_id)
+    assert finished.status == "done"
+    # The lost run counts as an attempt
+    assert finished.attempts == 2
+
+
+async def test_job_lost_on_its_last_attempt_fails(queue, calls):
+    job_id = await add_job("test_ok")
+    await queue._claim()
+    async with async_session_maker() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(attempts=2))
+        await session.commit()
+    await lose_claim(job_id, minutes_ago=11)
+
+    assert not await queue.run_next()
+    failed = await get_job(job_id)
+    assert failed.status == "failed"
+    assert "Lease expired" in failed.last_error
+    assert calls == []
+
+
+async def test_claimed_at_is_added_to_an_existing_jobs_table(db):
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE jobs DROP COLUMN claimed_at"))
+    await create_db_and_tables()
+    async with engine.connect() as conn:
+        columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns("jobs"))
+    assert "claimed_at" in {column["name"] for column in columns}
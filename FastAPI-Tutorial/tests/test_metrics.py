@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.metrics import Counter, Histogram, Registry
+
+
+def worker_registry(worker: str, directory) -> Registry:
+    """A registry as one worker process would have it, sharing directory"""
+    registry = Registry(worker=worker)
+    registry.register(Counter("jobs_total", "Jobs done", labels=("kind",)))
+    registry.register(Histogram("wait_seconds", "Wait", (0.1, 1)))
+    registry.directory = str(directory)
+    return registry
+
+
+def test_samples_are_labelled_with_the_worker():
+    registry = Registry(worker="7")
+    jobs = registry.register(Counter("jobs_total", "Jobs done", labels=("kind",)))
+    jobs.inc(kind="thumbnail")
+
+    assert 'jobs_total{kind="thumbnail",worker="7"} 1' in registry.render()
+
+
+def test_defaults_to_the_process_id():
+    assert Registry().worker == str(os.getpid())
+
+
+def test_render_covers_every_worker(tmp_path):
+    first = worker_registry("1", tmp_path)
+    second = worker_registry("2", tmp_path)
+    first.metrics[0].inc(2, kind="thumbnail")
+    second.metrics[0].inc(3, kind="thumbnail")
+    second.metrics[1].observe(0.5)
+    # What the second worker's background task does every interval
+    second._write(second.samples())
+
+    lines = first.render().splitlines()
+
+    # One header per metric, the workers' samples under it
+    assert lines.count("# TYPE jobs_total counter") == 1
+    assert 'jobs_total{kind="thumbnail",worker="1"} 2' in lines
+    assert 'jobs_total{kind="thumbnail",worker="2"} 3' in lines
+    assert 'wait_seconds_bucket{worker="2",le="1"} 1' in lines
+    assert lines.index('jobs_total{kind="thumbnail",worker="2"} 3') < lines.index("# HELP wait_seconds Wait")
+
+
+def test_workers_that_stopped_writing_are_dropped(tmp_path):
+    first = worker_registry("1", tmp_path)
+    gone = worker_registry("2", tmp_path)
+    gone.metrics[0].inc(kind="thumbnail")
+    gone._write(gone.samples())
+    stale = time.time() - 3 * first.interval - 1
+    os.utime(tmp_path / "2.json", (stale, stale))
+
+    assert 'worker="2"' not in first.render()
+    assert not (tmp_path / "2.json").exists()
+
+
+@pytest.mark.anyio
+async def test_stop_sharing_removes_the_worker_file(tmp_path):
+    registry = worker_registry("1", tmp_path)
+    registry.start_sharing(str(tmp_path), interval=60)
+    # Let the task write its first snapshot
+    while not (tmp_path / "1.json").exists():
+        await asyncio.sleep(0.01)
+
+    await registry.stop_sharing()
+
+    assert not (tmp_path / "1.json").exists()
+
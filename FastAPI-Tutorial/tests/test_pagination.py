@@ -0,0 +1,74 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.db import async_session_maker, create_db_and_tables, engine
+from app.feed import load_feed_page
+from app.pagination import (
+    SEARCH_MAX_RESULTS,
+    decode_cursor,
+    decode_offset_cursor,
+    encode_cursor,
+    encode_offset_cursor
+)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 1, 2, 3, 4, 5, 678)
+    post_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, post_id)) == (created_at, post_id)
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "", "bm90fGE=", encode_offset_cursor(5)])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_offset_cursor_round_trip():
+    assert decode_offset_cursor(encode_offset_cursor(40)) == 40
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_offset_cursor(-1), encode_offset_cursor(SEARCH_MAX_RESULTS)])
+def test_invalid_offset_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_offset_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("same_time", [False, True])
+async def test_feed_pages_return_every_post_once(user, add_posts, same_time):
+    user_id, _ = user
+    ids = await add_posts(user_id, 25, same_time=same_time)
+
+    seen = []
+    cursor = None
+    async with async_session_maker() as session:
+        while True:
+            page = await load_feed_page(session, cursor, 10)
+            seen += [post["id"] for post in page["posts"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+    assert len(seen) == 25
+    assert set(seen) == set(ids)
+
+
+@pytest.mark.anyio
+async def test_posts_from_before_the_guid_column_keep_their_author(user, add_posts):
+    user_id, _ = user
+    [post_id] = await add_posts(user_id, 1)
+    async with engine.begin() as conn:
+        # How the old UUID column stored it on SQLite: 32 hex digits, no dashes
+        await conn.execute(text("UPDATE posts SET user_id = :old"), {"old": uuid.UUID(user_id).hex})
+    await create_db_and_tables()
+
+    async with async_session_maker() as session:
+        page = await load_feed_page(session, None, 10)
+    assert [(post["id"], post["email"]) for post in page["posts"]] == [(post_id, "user@example.com")]
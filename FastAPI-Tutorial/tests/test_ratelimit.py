@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import ratelimit
+from app.app import batch_file_count
+from app.ratelimit import MemoryRateLimiter, rate_limit
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonic() as seen by the rate limiter, moved by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+async def test_bucket_allows_a_burst_then_waits(clock):
+    limiter = MemoryRateLimiter(max_keys=10)
+    for _ in range(3):
+        assert await limiter.hit("key", rate=2, burst=3) == 0
+    assert await limiter.hit("key", rate=2, burst=3) == pytest.approx(0.5)
+
+
+async def test_bucket_refills_over_time(clock):
+    limiter = MemoryRateLimiter(max_keys=10)
+    for _ in range(3):
+        await limiter.hit("key", rate=2, burst=3)
+    clock[0] += 0.5
+    assert await limiter.hit("key", rate=2, burst=3) == 0
+    assert await limiter.hit("key", rate=2, burst=3) > 0
+
+
+async def test_buckets_are_per_key(clock):
+    limiter = MemoryRateLimiter(max_keys=10)
+    assert await limiter.hit("a", rate=1, burst=1) == 0
+    assert await limiter.hit("b", rate=1, burst=1) == 0
+    assert await limiter.hit("a", rate=1, burst=1) > 0
+
+
+async def test_cost_takes_several_tokens(clock):
+    limiter = MemoryRateLimiter(max_keys=10)
+    assert await limiter.hit("key", rate=1, burst=5, cost=3) == 0
+    # 2 tokens left, 1 more is a second away
+    assert await limiter.hit("key", rate=1, burst=5, cost=3) == pytest.approx(1)
+    assert await limiter.hit("key", rate=1, burst=5, cost=2) == 0
+
+
+async def test_cost_over_the_burst_leaves_a_debt(clock):
+    limiter = MemoryRateLimiter(max_keys=10)
+    assert await limiter.hit("key", rate=1, burst=3, cost=5) == 0
+    # The bucket is at -2, the next token takes 3 seconds
+    assert await limiter.hit("key", rate=1, burst=3) == pytest.approx(3)
+
+
+async def test_slots():
+    limiter = MemoryRateLimiter(max_keys=10)
+    assert await limiter.acquire_slot("uploads", 2)
+    assert await limiter.acquire_slot("uploads", 2)
+    assert not await limiter.acquire_slot("uploads", 2)
+    await limiter.release_slot("uploads")
+    assert await limiter.acquire_slot("uploads", 2)
+
+
+async def test_feed_answers_429_after_the_burst(client, user):
+    _, headers = user
+    # FEED_RATE_BURST is 3 in the tests (conftest.py)
+    for _ in range(3):
+        assert (await client.get("/feed", headers=headers)).status_code == 200
+    response = await client.get("/feed", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def request_from(host: str) -> Request:
+    return Request({"type": "http", "headers": [], "client": (host, 12345)})
+
+
+async def test_per_ip_limit_is_off_by_default(clock):
+    check = rate_limit("test-default", rate=1, burst=1)
+    # Two users behind the same address (a NAT, or a proxy we don't trust) don't limit each other
+    await check(request_from("10.0.0.1"), SimpleNamespace(id="a"))
+    await check(request_from("10.0.0.1"), SimpleNamespace(id="b"))
+
+
+async def test_per_ip_limit(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit.settings, "ip_rate_limit_factor", 2)
+    check = rate_limit("test-ip", rate=1, burst=1)
+    for user_id in ("a", "b"):
+        await check(request_from("10.0.0.1"), SimpleNamespace(id=user_id))
+    with pytest.raises(HTTPException) as error:
+        await check(request_from("10.0.0.1"), SimpleNamespace(id="c"))
+    assert error.value.status_code == 429
+    await check(request_from("10.0.0.2"), SimpleNamespace(id="d"))
+
+
+def batch_request(*names: str) -> Request:
+    """A multipart /upload/batch request as the app receives it"""
+    files = [("files", (name, b"\xff\xd8", "image/jpeg")) for name in names]
+    built = httpx.Request("POST", "http://test/upload/batch", files=files)
+    body = built.read()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    headers = [(key.lower().encode(), value.encode()) for key, value in built.headers.items()]
+    return Request({"type": "http", "method": "POST", "headers": headers, "client": ("10.0.0.1", 1)}, receive)
+
+
+async def test_batch_costs_a_token_per_file(clock):
+    check = rate_limit("test-batch", rate=1, burst=5, cost=batch_file_count)
+    user = SimpleNamespace(id="a")
+    await check(batch_request("a.jpg", "b.jpg", "c.jpg"), user)
+    # 2 tokens left: a single upload passes, another 3 file batch doesn't
+    with pytest.raises(HTTPException) as error:
+        await check(batch_request("d.jpg", "e.jpg", "f.jpg"), user)
+    assert error.value.status_code == 429
+    await check(batch_request("g.jpg"), user)
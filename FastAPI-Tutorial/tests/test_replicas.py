@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import async_session_maker, engine
+from app.replicas import ReplicaRouter
+
+pytestmark = pytest.mark.anyio
+
+
+async def which_database(session) -> str:
+    return "primary" if session.bind is engine else "replica"
+
+
+@pytest.fixture
+async def router(db):
+    # A read only connection to the test database stands in for a replica
+    replica = create_async_engine(f"sqlite+aiosqlite:///file:{engine.url.database}?mode=ro&uri=true")
+    router = ReplicaRouter(async_session_maker, [replica], eject_seconds=30, read_after_write=5)
+    yield router
+    await router.dispose()
+
+
+async def test_reads_go_to_the_replica(router):
+    assert await router.read(which_database) == "replica"
+    assert await router.read(which_database, primary=True) == "primary"
+
+
+async def test_read_after_write_is_per_user(router):
+    await router.wrote("writer")
+    assert await router.recently_wrote("writer")
+    assert not await router.recently_wrote("someone else")
+
+
+async def test_feed_of_a_user_who_just_wrote_comes_from_the_primary(client, user, monkeypatch):
+    from app import app as app_module
+
+    user_id, headers = user
+    primary_reads = []
+    monkeypatch.setattr(app_module.replicas, "replicas", ["stand-in"])
+
+    async def read(query, primary=False):
+        primary_reads.append(primary)
+        async with async_session_maker() as session:
+            return await query(session)
+
+    monkeypatch.setattr(app_module.replicas, "read", read)
+
+    response = await client.post(
+        "/upload", files={"file": ("a.jpg", b"jpeg bytes", "image/jpeg")}, data={"caption": "fresh"}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert (await client.get("/feed", headers=headers)).json()["posts"][0]["caption"] == "fresh"
+    assert primary_reads == [True]
+
+
+async def test_feed_cached_right_after_a_change_comes_from_the_primary(client, user, other_user, monkeypatch):
+    from app import app as app_module
+
+    _, headers = user
+    _, other_headers = other_user
+    reads = []
+    monkeypatch.setattr(app_module.replicas, "replicas", ["stand-in"])
+
+    async def read(query, primary=False):
+        reads.append("primary" if primary else "replica")
+        if not primary:
+            # A replica that hasn't caught up with the upload yet
+            return {"posts": [], "next_cursor": None}
+        async with async_session_maker() as session:
+            return await query(session)
+
+    monkeypatch.setattr(app_module.replicas, "read", read)
+
+    response = await client.post(
+        "/upload", files={"file": ("a.jpg", b"jpeg bytes", "image/jpeg")}, data={"caption": "fresh"}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+
+    # Another user's read lands between the upload and the uploader's next read.
+    # The page it caches is the one everyone gets for FEED_CACHE_TTL.
+    assert (await client.get("/feed", headers=other_headers)).json()["posts"][0]["caption"] == "fresh"
+    assert (await client.get("/feed", headers=other_headers)).json()["posts"][0]["caption"] == "fresh"
+    assert (await client.get("/feed", headers=headers)).json()["posts"][0]["caption"] == "fresh"
+    assert reads == ["primary", "primary"]
+
+
+async def test_feed_goes_back_to_the_replicas_after_the_window(client, user, monkeypatch):
+    from app import app as app_module
+    from app.cache import cache
+
+    _, headers = user
+    reads = []
+    monkeypatch.setattr(app_module.replicas, "replicas", ["stand-in"])
+
+    async def read(query, primary=False):
+        reads.append("primary" if primary else "replica")
+        async with async_session_maker() as session:
+            return await query(session)
+
+    monkeypatch.setattr(app_module.replicas, "read", read)
+
+    await app_module.invalidate_feed()
+    await client.get("/feed", headers=headers)
+    # REPLICA_READ_AFTER_WRITE and the cached page both run out
+    cache._data.clear()
+    await client.get("/feed", headers=headers)
+    assert reads == ["primary", "replica"]
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import delete, text, update
+
+from app.db import Post, async_session_maker, create_search_index, engine
+from app.search import search_posts
+
+pytestmark = pytest.mark.anyio
+
+
+async def search(q: str) -> list[str]:
+    async with async_session_maker() as session:
+        page = await search_posts(session, q, None, 100)
+    return [post["caption"] for post in page["posts"]]
+
+
+async def test_search_follows_inserts_updates_and_deletes(user, add_posts):
+    user_id, _ = user
+    ids = await add_posts(user_id, 3)
+    assert sorted(await search("post")) == ["post 0", "post 1", "post 2"]
+
+    async with async_session_maker() as session:
+        await session.execute(update(Post).where(Post.id == ids[0]).values(caption="sunset beach"))
+        await session.execute(delete(Post).where(Post.id == ids[1]))
+        await session.commit()
+
+    assert await search("sunset") == ["sunset beach"]
+    assert await search("post") == ["post 2"]
+
+
+async def test_search_survives_vacuum(user, add_posts):
+    user_id, _ = user
+    ids = await add_posts(user_id, 20)
+    # VACUUM may renumber the implicit rowids of posts, the index doesn't use them
+    async with async_session_maker() as session:
+        await session.execute(delete(Post).where(Post.id.in_(ids[:10])))
+        await session.commit()
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM"))
+
+    assert sorted(await search("post")) == sorted(f"post {n}" for n in range(10, 20))
+
+
+async def test_index_keyed_on_rowid_is_replaced(user, add_posts):
+    user_id, _ = user
+    await add_posts(user_id, 2)
+    async with engine.begin() as conn:
+        # What the first version of create_search_index left behind
+        await conn.execute(text("DROP TABLE posts_search_keys"))
+        await conn.execute(text("DROP TABLE posts_fts"))
+        await conn.execute(text("CREATE VIRTUAL TABLE posts_fts USING fts5(caption, content='posts', content_rowid='rowid')"))
+        await conn.run_sync(create_search_index)
+
+    assert sorted(await search("post")) == ["post 0", "post 1"]
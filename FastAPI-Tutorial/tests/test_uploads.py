@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+from app.storage import LocalStorage, get_storage
+
+pytestmark = pytest.mark.anyio
+
+DATA = os.urandom(3000)
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    """1KB parts, and the third one failing every time"""
+    storage = get_storage()
+    monkeypatch.setattr(storage, "part_size", 1024)
+    monkeypatch.setattr(storage, "max_retries", 1)
+    upload_part = LocalStorage.upload_part
+
+    def failing_upload_part(self, upload_id, part_number, data):
+        if part_number == 3:
+            raise OSError("connection reset")
+        return upload_part(self, upload_id, part_number, data)
+
+    monkeypatch.setattr(LocalStorage, "upload_part", failing_upload_part)
+    return monkeypatch
+
+
+async def test_only_the_owner_can_resume_an_upload(client, user, small_parts):
+    _, headers = user
+    response = await client.post("/upload", files={"file": ("a.bin", DATA, "image/jpeg")}, headers=headers)
+    assert response.status_code == 500
+    detail = response.json()["detail"]
+    assert detail["received"] == 2048
+
+    await client.post("/auth/register", json={"email": "other@example.com", "password": "password123"})
+    login = await client.post("/auth/jwt/login", data={"username": "other@example.com", "password": "password123"})
+    other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    small_parts.undo()
+
+    rest = {"file": ("a.bin", DATA[2048:], "image/jpeg")}
+    form = {"upload_id": detail["upload_id"], "offset": "2048"}
+    response = await client.post("/upload", files=rest, data=form, headers=other)
+    assert response.status_code == 404
+
+    response = await client.post("/upload", files=rest, data=form, headers=headers)
+    assert response.status_code == 200, response.text
+    stored = get_storage().root / response.json()["url"].rsplit("/", 1)[1]
+    assert stored.read_bytes() == DATA
+
+
+async def test_abandoned_uploads_are_cleaned_while_running(client, user, small_parts):
+    _, headers = user
+    storage = get_storage()
+    response = await client.post("/upload", files={"file": ("a.bin", DATA, "image/jpeg")}, headers=headers)
+    abandoned = storage.staging / response.json()["detail"]["upload_id"]
+    assert abandoned.is_dir()
+    small_parts.undo()
+
+    # Older than MULTIPART_RESUME_TTL, and the hourly clean is due
+    old = time.time() - storage.resume_ttl - 60
+    os.utime(abandoned, (old, old))
+    storage._next_clean = 0
+
+    response = await client.post("/upload", files={"file": ("b.bin", DATA, "image/jpeg")}, headers=headers)
+    assert response.status_code == 200
+    assert not abandoned.exists()
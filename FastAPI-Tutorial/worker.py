@@ -0,0 +1,9 @@
+import asyncio
+import os
+
+from app.jobs import run_worker
+
+# Runs background jobs outside the web process, start the app with JOB_WORKERS=0
+# and as many of these as needed: python worker.py
+if __name__ == "__main__":
+    asyncio.run(run_worker(workers=int(os.getenv("WORKER_CONCURRENCY", "4"))))
@@ -6,6 +6,24 @@ class Settings(BaseSettings):
     environment: str = "development"
     location: str = "local"
     
+    # Server (app/serve.py)
+    host: str = "0.0.0.0"
+    port: int = 8000
+    # Worker processes, 0 = the CPUs this container may use
+    web_concurrency: int = 0
+    # Idle keep-alive seconds, above the load balancer's idle timeout (60s on most)
+    keep_alive: int = 65
+    # Pending connections the kernel queues before refusing new ones
+    backlog: int = 2048
+    # Index creation and other one-off startup work, app/serve.py does it once
+    # and turns it off for the workers
+    run_startup_tasks: bool = True
+    # Directory the workers share their metrics through, so /metrics covers
+    # all of them. app/serve.py creates one when it starts several workers
+    metrics_dir: str = ""
+    # Seconds between the workers' metric snapshots
+    metrics_share_interval: float = 5
+    
     # Logging
     debug: bool = False
     
@@ -16,6 +34,44 @@ class Settings(BaseSettings):
     # Connection pooling
     mongodb_max_pool_size: int = 100
     mongodb_min_pool_size: int = 10
+    # Idle pooled connections are closed after this long (0 = never)
+    mongodb_max_idle_time_ms: int = 60000
+    # How long a request waits for a free pooled connection before failing
+    mongodb_wait_queue_timeout_ms: int = 5000
+    mongodb_server_selection_timeout_ms: int = 5000
+    # Wire compression, in order of preference, e.g. "zstd,snappy,zlib".
+    # zstd needs the zstandard package and snappy python-snappy, compressors
+    # the driver can't load are skipped. Empty = no compression.
+    mongodb_compressors: str = ""
+    
+    # Compression: responses smaller than this many bytes are sent uncompressed.
+    # gzip level (1-9) / brotli quality (0-11): higher is smaller but costs more CPU.
+    compression_minimum_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    
+    # Health monitor: seconds between background pings and how long one may take
+    health_check_interval: float = 5
+    health_check_timeout: float = 2
+    # Consecutive failed pings before /readyz reports the database as down
+    health_failure_threshold: int = 3
+    # Share of the pool in use above which /readyz asks for no more traffic
+    pool_saturation_threshold: float = 0.9
+    
+    # Shutdown: on SIGTERM /readyz fails at once but requests are still served
+    # for drain_delay seconds, then in-flight ones get drain_timeout seconds to
+    # finish. Keep the sum under terminationGracePeriodSeconds (30 by default).
+    drain_delay: float = 5
+    drain_timeout: float = 20
+    
+    # Items
+    items_collection: str = "items"
+    items_page_size: int = 50
+    items_max_page_size: int = 1000
+    # Documents per insert_many when ingesting
+    bulk_batch_size: int = 1000
+    # Documents fetched per round trip when exporting
+    export_batch_size: int = 1000
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,6 +1,7 @@
 from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.config import settings
+from app.metrics import CommandMetricsListener, PoolMetricsListener
 
 class MongoDB:
     client: Optional[AsyncIOMotorClient] = None
@@ -9,7 +10,17 @@ mongodb = MongoDB()
 
 async def connect_to_mongo():
     """Connect to MongoDB"""
-    mongodb.client = AsyncIOMotorClient(settings.mongodb_url)
+    options = dict(
+        maxPoolSize=settings.mongodb_max_pool_size,
+        minPoolSize=settings.mongodb_min_pool_size,
+        maxIdleTimeMS=settings.mongodb_max_idle_time_ms or None,
+        waitQueueTimeoutMS=settings.mongodb_wait_queue_timeout_ms,
+        serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms,
+        event_listeners=[PoolMetricsListener(), CommandMetricsListener()]
+    )
+    if settings.mongodb_compressors:
+        options["compressors"] = settings.mongodb_compressors
+    mongodb.client = AsyncIOMotorClient(settings.mongodb_url, **options)
     print(f"📊 Connected to MongoDB at {settings.mongodb_url}")
 
 async def close_mongo_connection():
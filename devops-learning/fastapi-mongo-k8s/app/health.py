@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Optional
+
+from app.config import settings
+from app.database import get_database
+from app.metrics import pool_connections_in_use
+from app.shutdown import drain
+
+
+class HealthMonitor:
+    """
+    Pings MongoDB in the background and keeps the result, so probes read the
+    cached state instead of each one sending its own ping. With many replicas
+    and tight probe periods that is most of the traffic Mongo sees from an
+    idle deployment.
+    """
+
+    def __init__(self):
+        self.db_ok = False
+        self.consecutive_failures = 0
+        self.last_check: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self):
+        start = time.monotonic()
+        try:
+            db = await get_database()
+            await asyncio.wait_for(db.command("ping"), timeout=settings.health_check_timeout)
+            self.db_ok = True
+            self.consecutive_failures = 0
+            self.last_error = None
+            self.last_latency = time.monotonic() - start
+        except Exception as e:
+            self.consecutive_failures += 1
+            self.last_error = str(e) or type(e).__name__
+            # One slow ping shouldn't pull the pod out of the Service
+            if self.consecutive_failures >= settings.health_failure_threshold:
+                self.db_ok = False
+        finally:
+            self.last_check = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.health_check_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def pool_saturation(self) -> float:
+        """
+        Share of the connection pool checked out, for the busiest server.
+        maxPoolSize applies to each server's pool, summing over the replica
+        set would call a half used pool on three members saturated.
+        """
+        return pool_connections_in_use.max() / settings.mongodb_max_pool_size
+
+    @property
+    def saturated(self) -> bool:
+        return self.pool_saturation >= settings.pool_saturation_threshold
+
+    @property
+    def ready(self) -> bool:
+        return self.db_ok and not self.saturated and not drain.draining
+
+    def status(self) -> dict:
+        return {
+            "database": "connected" if self.db_ok else "disconnected",
+            "draining": drain.draining,
+            "pool_saturation": round(self.pool_saturation, 3),
+            "last_check_age": round(time.monotonic() - self.last_check, 3) if self.last_check else None,
+            "last_latency": round(self.last_latency, 4) if self.last_latency is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+health_monitor = HealthMonitor()
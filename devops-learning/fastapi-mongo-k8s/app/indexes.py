@@ -0,0 +1,141 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class Index:
+    """
+    One index the app relies on. Keys are (field, direction) pairs, so
+    compound indexes are just several pairs. ttl_seconds makes it a TTL
+    index (single date field), partial_filter a partial one.
+    """
+    collection: str
+    keys: tuple
+    name: str
+    unique: bool = False
+    ttl_seconds: Optional[int] = None
+    partial_filter: Optional[dict] = None
+
+    def model(self) -> IndexModel:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.ttl_seconds is not None:
+            options["expireAfterSeconds"] = self.ttl_seconds
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        return IndexModel(list(self.keys), **options)
+
+    def matches(self, info: dict) -> bool:
+        """Is the existing index (from index_information()) the same as this one?"""
+        return (
+            [(key, direction) for key, direction in info["key"]] == list(self.keys)
+            and info.get("unique", False) == self.unique
+            and info.get("expireAfterSeconds") == self.ttl_seconds
+            and info.get("partialFilterExpression") == self.partial_filter
+        )
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    """A query the app runs, checked with explain() in debug mode"""
+    description: str
+    collection: str
+    filter: dict
+    sort: tuple = field(default_factory=tuple)
+
+
+# Every query in app/items.py should have an index here and a shape below.
+# Only fields that are actually filtered or sorted on get an index: each one
+# costs a write on every insert and update.
+INDEXES = [
+    # ?name= filter, paged by _id
+    Index(settings.items_collection, (("name", ASCENDING), ("_id", ASCENDING)), "name_id"),
+]
+
+QUERY_SHAPES = [
+    QueryShape("list items", settings.items_collection, {"_id": {"$gt": ObjectId()}}, (("_id", ASCENDING),)),
+    QueryShape("list items by name", settings.items_collection, {"name": "x", "_id": {"$gt": ObjectId()}}, (("_id", ASCENDING),)),
+    QueryShape("get item", settings.items_collection, {"_id": ObjectId()}),
+]
+
+
+async def ensure_indexes(db, indexes: list[Index] = INDEXES):
+    """
+    Make the database match the registry: missing indexes are created, ones
+    whose definition changed are dropped and rebuilt. Indexes that are not in
+    the registry are left alone.
+    """
+    by_collection: dict[str, list[Index]] = {}
+    for index in indexes:
+        by_collection.setdefault(index.collection, []).append(index)
+
+    for name, wanted in by_collection.items():
+        collection = db[name]
+        existing = await collection.index_information()
+        missing = []
+        for index in wanted:
+            info = existing.get(index.name)
+            if info is not None and index.matches(info):
+                continue
+            if info is not None:
+                print(f"🔧 Index {name}.{index.name} changed, rebuilding")
+                await collection.drop_index(index.name)
+            missing.append(index)
+        if missing:
+            await collection.create_indexes([index.model() for index in missing])
+            print(f"🔧 Created indexes on {name}: {', '.join(index.name for index in missing)}")
+
+
+def find_stages(plan: dict) -> list[str]:
+    """Every stage name in an explain() plan tree"""
+    stages = [plan.get("stage", "")]
+    if "inputStage" in plan:
+        stages += find_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += find_stages(child)
+    return stages
+
+
+async def check_query_plans(db, shapes: list[QueryShape] = QUERY_SHAPES) -> list[str]:
+    """
+    Run explain() on each query shape and warn about the ones the planner
+    answers with a collection scan. Returns their descriptions.
+    """
+    collscans = []
+    for shape in shapes:
+        cursor = db[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(list(shape.sort))
+        try:
+            explain = await cursor.explain()
+        except PyMongoError as e:
+            print(f"⚠️  Could not explain '{shape.description}': {e}")
+            continue
+        plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        # Newer servers wrap the classic plan as queryPlan
+        if "COLLSCAN" in find_stages(plan.get("queryPlan", plan)):
+            collscans.append(shape.description)
+            print(f"⚠️  '{shape.description}' does a COLLSCAN on {shape.collection}: {shape.filter}")
+    return collscans
+
+
+async def prepare_database(db):
+    """
+    Startup work against the database: reconcile indexes and, in debug, check
+    the query plans. Failures are reported, not raised, so a MongoDB outage
+    doesn't crash-loop the pod (/readyz reports it instead).
+    """
+    try:
+        await ensure_indexes(db)
+        # In debug, catch queries that would scan the whole collection
+        if settings.debug:
+            await check_query_plans(db)
+    except PyMongoError as e:
+        print(f"⚠️  Could not reconcile indexes: {e}")
@@ -0,0 +1,243 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+import bson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from app.config import settings
+from app.database import get_database
+from app.http_cache import etag_matches, make_etag, not_modified
+from app.models import Item, ItemInDB
+
+router = APIRouter(prefix="/items", tags=["items"])
+
+# Line errors reported back from an import, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Longest NDJSON line an import accepts. An item is a few hundred bytes, a
+# longer line is rejected without being held in memory.
+MAX_IMPORT_LINE_BYTES = 64 * 1024
+
+# Item pages may be kept by clients and proxies, but must be revalidated before reuse
+LIST_CACHE_HEADERS = {"Cache-Control": "no-cache"}
+
+
+async def get_collection():
+    """Items collection"""
+    db = await get_database()
+    return db[settings.items_collection]
+
+
+def to_item(doc: dict) -> dict:
+    """Mongo document -> ItemInDB shaped dict"""
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+def json_default(value):
+    """json.dumps fallback for the types Mongo documents carry"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_object_id(item_id: str) -> ObjectId:
+    try:
+        return ObjectId(item_id)
+    except InvalidId:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item id")
+
+
+async def insert_batch(collection, docs: list[dict]) -> tuple[int, list[dict]]:
+    """
+    insert_many with ordered=False: the server keeps going past a bad
+    document instead of stopping the whole batch at the first error.
+    """
+    if not docs:
+        return 0, []
+    try:
+        result = await collection.insert_many(docs, ordered=False)
+        return len(result.inserted_ids), []
+    except BulkWriteError as e:
+        errors = [{"index": err["index"], "error": err["errmsg"]} for err in e.details["writeErrors"]]
+        return e.details["nInserted"], errors
+
+
+@router.post("", response_model=ItemInDB, status_code=status.HTTP_201_CREATED)
+async def create_item(item: Item, collection=Depends(get_collection)):
+    doc = item.model_dump()
+    result = await collection.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return to_item(doc)
+
+
+@router.post("/bulk")
+async def create_items(items: list[Item], collection=Depends(get_collection)):
+    """Insert a JSON array of items, written in batches of BULK_BATCH_SIZE"""
+    inserted = 0
+    errors = []
+    batch_size = settings.bulk_batch_size
+    for offset in range(0, len(items), batch_size):
+        docs = [item.model_dump() for item in items[offset:offset + batch_size]]
+        count, batch_errors = await insert_batch(collection, docs)
+        inserted += count
+        errors += [{**err, "index": err["index"] + offset} for err in batch_errors]
+    return {"inserted": inserted, "failed": len(items) - inserted, "errors": errors[:MAX_REPORTED_ERRORS]}
+
+
+@router.post("/import")
+async def import_items(request: Request, collection=Depends(get_collection)):
+    """
+    Ingest NDJSON (one item per line) straight from the request body.
+
+    The body is read as it arrives and flushed to Mongo every
+    BULK_BATCH_SIZE items, so memory stays at one batch no matter how
+    large the upload is. Invalid lines are skipped and counted, the first
+    MAX_REPORTED_ERRORS of them are reported.
+    """
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+    batch_lines = []
+    line_number = 0
+
+    def report(line: int, error: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "error": error})
+
+    async def flush():
+        nonlocal inserted, failed
+        count, batch_errors = await insert_batch(collection, batch)
+        inserted += count
+        failed += len(batch) - count - len(batch_errors)
+        for err in batch_errors:
+            report(batch_lines[err["index"]], err["error"])
+        batch.clear()
+        batch_lines.clear()
+
+    async def lines() -> AsyncIterator[Optional[bytes]]:
+        """Body lines as they arrive, None in place of a line over MAX_IMPORT_LINE_BYTES"""
+        buffer = b""
+        too_long = False
+        async for chunk in request.stream():
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n")
+            for line in complete:
+                yield None if too_long or len(line) > MAX_IMPORT_LINE_BYTES else line
+                too_long = False
+            if len(buffer) > MAX_IMPORT_LINE_BYTES:
+                # Drop the line's bytes as they come, only where it ends matters now
+                buffer = b""
+                too_long = True
+        if buffer or too_long:
+            yield None if too_long or len(buffer) > MAX_IMPORT_LINE_BYTES else buffer
+
+    async for line in lines():
+        line_number += 1
+        if line is None:
+            report(line_number, f"Line is longer than {MAX_IMPORT_LINE_BYTES} bytes")
+            continue
+        if not line.strip():
+            continue
+        try:
+            batch.append(Item.model_validate_json(line).model_dump())
+            batch_lines.append(line_number)
+        except ValidationError as e:
+            report(line_number, e.errors(include_url=False)[0]["msg"])
+        if len(batch) >= settings.bulk_batch_size:
+            await flush()
+    await flush()
+
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+
+@router.get("")
+async def list_items(
+    request: Request,
+    response: Response,
+    after: Optional[str] = Query(None, description="Return items after this id (the previous page's next_cursor)"),
+    name: Optional[str] = Query(None, description="Only items with exactly this name"),
+    limit: int = Query(settings.items_page_size, ge=1, le=settings.items_max_page_size),
+    collection=Depends(get_collection)
+):
+    """
+    Keyset pagination on _id: each page is an index range scan that starts
+    where the previous one ended, instead of skip() walking past every
+    earlier item. Filtering by name uses the (name, _id) index, see
+    app/indexes.py.
+    """
+    query = {"_id": {"$gt": parse_object_id(after)}} if after else {}
+    if name is not None:
+        query["name"] = name
+    docs = await collection.find(query).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    
+    # The raw BSON of the page is its version: encoding it is a C call, far
+    # cheaper than building the JSON body, which a 304 skips entirely
+    etag = make_etag(*(bson.encode(doc) for doc in docs))
+    if etag_matches(request, etag):
+        return not_modified(etag, LIST_CACHE_HEADERS)
+    response.headers.update({"ETag": etag, **LIST_CACHE_HEADERS})
+    
+    next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return {"items": [to_item(doc) for doc in docs[:limit]], "next_cursor": next_cursor}
+
+
+@router.get("/export")
+async def export_items(
+    after: Optional[str] = Query(None, description="Resume an export after this id"),
+    collection=Depends(get_collection)
+):
+    """
+    Stream every item as NDJSON in _id order. Documents are pulled from the
+    cursor EXPORT_BATCH_SIZE at a time and written out as they come, so the
+    worker never holds more than one batch. An interrupted export can be
+    resumed with ?after=<last id received>.
+    """
+    query = {"_id": {"$gt": parse_object_id(after)}} if after else {}
+    cursor = collection.find(query).sort("_id", 1).batch_size(settings.export_batch_size)
+
+    async def generate():
+        try:
+            async for doc in cursor:
+                yield json.dumps(to_item(doc), default=json_default) + "\n"
+        finally:
+            await cursor.close()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.get("/{item_id}", response_model=ItemInDB)
+async def get_item(item_id: str, collection=Depends(get_collection)):
+    doc = await collection.find_one({"_id": parse_object_id(item_id)})
+    if doc is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    return to_item(doc)
+
+
+@router.put("/{item_id}", response_model=ItemInDB)
+async def update_item(item_id: str, item: Item, collection=Depends(get_collection)):
+    doc = await collection.find_one_and_update(
+        {"_id": parse_object_id(item_id)},
+        {"$set": item.model_dump(exclude={"created_at"})},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    return to_item(doc)
+
+
+@router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_item(item_id: str, collection=Depends(get_collection)):
+    result = await collection.delete_one({"_id": parse_object_id(item_id)})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
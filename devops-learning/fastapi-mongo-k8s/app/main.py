@@ -1,8 +1,14 @@
 from fastapi import FastAPI, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from app.database import connect_to_mongo, close_mongo_connection, get_database
+from app.health import health_monitor
+from app.indexes import prepare_database
 from app.config import settings
+from app.items import router as items_router
+from app.metrics import MetricsMiddleware, registry
+from app.compression import CompressionMiddleware
+from app.shutdown import DrainMiddleware, drain
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -10,9 +16,18 @@ async def lifespan(app: FastAPI):
     print("🚀 Starting up...")
     await connect_to_mongo()
     print("✅ Connected to MongoDB")
+    # app/serve.py already did it once before starting the workers
+    if settings.run_startup_tasks:
+        await prepare_database(await get_database())
+    health_monitor.start()
+    if settings.metrics_dir:
+        registry.start_sharing(settings.metrics_dir, settings.metrics_share_interval)
+    drain.install()
     yield
     # Shutdown
     print("🛑 Shutting down...")
+    await health_monitor.stop()
+    await registry.stop_sharing()
     await close_mongo_connection()
     print("✅ MongoDB connection closed")
 
@@ -21,6 +36,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.gzip_level,
+    brotli_quality=settings.brotli_quality
+)
+app.add_middleware(DrainMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(items_router)
+
 @app.get("/")
 async def root():
     return {
@@ -33,14 +59,35 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/livez")
+async def livez():
+    """Liveness: the process is up and the event loop is answering"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness, from the health monitor's cached state: the last pings reached
+    MongoDB and the connection pool isn't saturated. Never touches the database.
+    """
+    if health_monitor.ready:
+        return {"status": "ready", **health_monitor.status()}
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "not ready", **health_monitor.status()}
+    )
+
 @app.get("/db-health")
 async def db_health():
-    try:
-        db = await get_database()
-        await db.command("ping")
-        return {"status": "healthy", "database": "connected"}
-    except Exception as e:
-        return JSONResponse(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            content={"status": "unhealthy", "error": str(e)}
-        )
\ No newline at end of file
+    # Cached too, so a probe pointed here doesn't ping Mongo on every call
+    if health_monitor.db_ok:
+        return {"status": "healthy", **health_monitor.status()}
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "unhealthy", **health_monitor.status()}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Request, connection pool and command metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
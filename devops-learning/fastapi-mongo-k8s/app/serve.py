@@ -0,0 +1,73 @@
+"""
+Production launcher: python -m app.serve
+
+Does the one-off startup work (index reconciliation) once, then starts
+WEB_CONCURRENCY uvicorn workers that skip it.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+from app.config import settings
+
+
+def cpu_count() -> int:
+    """
+    CPUs this process may actually use. In a container os.cpu_count() is the
+    host's, the CPU limit only shows up as a cgroup quota.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+async def run_startup_tasks():
+    from app.database import close_mongo_connection, connect_to_mongo, get_database
+    from app.indexes import prepare_database
+
+    await connect_to_mongo()
+    try:
+        await prepare_database(await get_database())
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    if settings.run_startup_tasks:
+        asyncio.run(run_startup_tasks())
+        # Read by the workers' settings when they start
+        os.environ["RUN_STARTUP_TASKS"] = "false"
+
+    workers = settings.web_concurrency or cpu_count()
+    shared_metrics = None
+    if workers > 1 and not settings.metrics_dir:
+        # Each worker has its own metrics, /metrics merges them from here
+        shared_metrics = tempfile.mkdtemp(prefix="metrics-")
+        os.environ["METRICS_DIR"] = shared_metrics
+
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=workers,
+        # uvloop and httptools when installed (uvicorn[standard]), asyncio and h11 otherwise
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=settings.keep_alive,
+        backlog=settings.backlog,
+        # A log line per request is real overhead at load, /metrics covers it
+        access_log=False
+    )
+
+    if shared_metrics:
+        shutil.rmtree(shared_metrics, ignore_errors=True)
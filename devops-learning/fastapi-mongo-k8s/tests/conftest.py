@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.items import get_collection
+from app.main import app
+
+
+class FakeCollection:
+    """
+    Stands in for the items collection on the insert path. Items named
+    "duplicate" fail like a unique index violation, the rest of their
+    batch is still inserted (ordered=False).
+    """
+
+    def __init__(self):
+        self.docs = []
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append(len(docs))
+        errors = [
+            {"index": index, "errmsg": "E11000 duplicate key error"}
+            for index, doc in enumerate(docs)
+            if doc["name"] == "duplicate"
+        ]
+        inserted = [doc for doc in docs if doc["name"] != "duplicate"]
+        self.docs += inserted
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=list(range(len(docs))))
+
+
+@pytest.fixture
+def collection():
+    fake = FakeCollection()
+    app.dependency_overrides[get_collection] = lambda: fake
+    yield fake
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(collection):
+    # No lifespan: the routes under test only see the fake collection
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app import items
+from app.config import settings
+
+pytestmark = pytest.mark.asyncio
+
+
+def ndjson(*docs) -> bytes:
+    return b"".join(json.dumps(doc).encode() + b"\n" for doc in docs)
+
+
+def item(name: str = "widget") -> dict:
+    return {"name": name, "price": 1.5}
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def test_import_flushes_in_batches(client, collection, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_batch_size", 3)
+
+    response = await client.post("/items/import", content=ndjson(*[item() for _ in range(7)]))
+
+    assert response.json() == {"inserted": 7, "failed": 0, "errors": []}
+    assert collection.batches == [3, 3, 1]
+
+
+async def test_import_reports_lines_that_fail(client, collection, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_batch_size", 2)
+    body = ndjson(item(), {"name": "", "price": 1}) + b"\n" + ndjson(item(), item("duplicate"), item())
+
+    result = (await client.post("/items/import", content=body)).json()
+
+    assert result["inserted"] == 3
+    assert result["failed"] == 2
+    # Line numbers count the blank line, validation and insert errors alike
+    assert [error["line"] for error in result["errors"]] == [2, 5]
+    assert "duplicate key" in result["errors"][1]["error"]
+
+
+async def test_import_caps_reported_errors(client, collection, monkeypatch):
+    monkeypatch.setattr(items, "MAX_REPORTED_ERRORS", 3)
+    body = ndjson(*[{"name": "", "price": 1}] * 10) + ndjson(item())
+
+    result = (await client.post("/items/import", content=body)).json()
+
+    assert result["inserted"] == 1
+    assert result["failed"] == 10
+    assert [error["line"] for error in result["errors"]] == [1, 2, 3]
+
+
+async def test_import_rejects_long_lines(client, collection, monkeypatch):
+    monkeypatch.setattr(items, "MAX_IMPORT_LINE_BYTES", 100)
+    long_line = json.dumps({"name": "x", "price": 1, "description": "y" * 500}).encode()
+
+    # The long line arrives over several chunks, the last one without a newline
+    body = chunks(ndjson(item()), long_line[:200], long_line[200:] + b"\n", ndjson(item()), long_line)
+    result = (await client.post("/items/import", content=body)).json()
+
+    assert result["inserted"] == 2
+    assert result["failed"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 4]
+    assert "longer than 100 bytes" in result["errors"][0]["error"]